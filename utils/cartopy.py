@@ -1,6 +1,7 @@
 import numpy as np
 import cartopy.crs as ccrs
-from utils.geometry import smoothen
+
+_plate_carree = ccrs.PlateCarree()
 
 
 def transform_points(from_crs, to_crs, x, y):
@@ -11,36 +12,134 @@ def transform_points(from_crs, to_crs, x, y):
     return xy_new[..., 0], xy_new[..., 1]
 
 
-def transform_bbox(from_crs, to_crs, bbox):
+def transform_bboxes(from_crs, to_crs, bboxes, tol=1e-3, n_init=8, max_depth=12):
+    """
+    Transform many bounding boxes from one cartopy CRS to another.
+    bboxes are given and returned as (N, 4) arrays of (left, bottom, right, top).
+
+    To make sure that the new bounding boxes cover the area even when boundaries
+    are tilted/curved with respect to the original projection, the edges are
+    densified adaptively: each edge starts out with n_init segments, and
+    segments are split as long as the projected midpoint deviates from the
+    projected chord by more than tol (relative to the size of the transformed
+    box), up to max_depth times. All points of a refinement step, for all
+    boxes, are transformed in one call.
+    """
+    bboxes = np.atleast_2d(np.asarray(bboxes, dtype=float))
+    nbox = len(bboxes)
+    l, b, r, t = bboxes.T
+
+    # edges as (start, end) points in the original CRS: bottom, right, top, left
+    starts = np.stack([np.column_stack(p) for p in [(l, b), (r, b), (r, t), (l, t)]], axis=1)
+    ends = np.stack([np.column_stack(p) for p in [(r, b), (r, t), (l, t), (l, b)]], axis=1)
+    box_id = np.repeat(np.arange(nbox), 4)
+    starts, ends = starts.reshape(-1, 2), ends.reshape(-1, 2)
+
+    # initial segments
+    frac = np.linspace(0, 1, n_init + 1)
+    p0 = starts[:, np.newaxis] + frac[:-1, np.newaxis]*(ends - starts)[:, np.newaxis]
+    p1 = starts[:, np.newaxis] + frac[1:, np.newaxis]*(ends - starts)[:, np.newaxis]
+    p0, p1 = p0.reshape(-1, 2), p1.reshape(-1, 2)
+    seg_box = np.repeat(box_id, n_init)
+
+    def project(pts):
+        x, y = transform_points(from_crs, to_crs, pts[:, 0], pts[:, 1])
+        return np.column_stack((x, y))
+
+    q0, q1 = np.split(project(np.concatenate([p0, p1])), 2)
+
+    lo = np.full((nbox, 2), np.inf)
+    hi = np.full((nbox, 2), -np.inf)
+
+    def update_extent(q, ids):
+        finite = np.isfinite(q).all(axis=1)
+        np.minimum.at(lo, ids[finite], q[finite])
+        np.maximum.at(hi, ids[finite], q[finite])
+
+    update_extent(q0, seg_box)
+
+    for _ in range(max_depth):
+        if not len(p0):
+            break
+        mid = (p0 + p1)/2
+        qm = project(mid)
+        update_extent(qm, seg_box)
+
+        scale = np.max(hi - lo, axis=1)[seg_box]
+        with np.errstate(invalid='ignore'):
+            deviation = np.hypot(*(qm - (q0 + q1)/2).T)
+            refine = deviation > tol*scale
+        # split segments that need refinement into two halves
+        p0, p1 = (np.concatenate([p0[refine], mid[refine]]),
+                  np.concatenate([mid[refine], p1[refine]]))
+        q0, q1 = (np.concatenate([q0[refine], qm[refine]]),
+                  np.concatenate([qm[refine], q1[refine]]))
+        seg_box = np.concatenate([seg_box[refine], seg_box[refine]])
+
+    return np.column_stack((lo[:, 0], lo[:, 1], hi[:, 0], hi[:, 1]))
+
+
+def transform_bbox(from_crs, to_crs, bbox, **kwargs):
     """
     Transform a bounding box from one cartopy CRS to another.
     bbox is given and returned as (left, bottom, right, top) tuple.
+
+    See transform_bboxes for kwargs.
     """
-    l, b, r, t = bbox
-    bbox_pts = [
-            (l, b),
-            (r, b),
-            (r, t),
-            (l, t),
-        ]
-
-    # make sure that new bounding box covers area even when boundaries
-    # are tilted/curved with respect to the original projection
-    bbox_smoothed = np.array(smoothen(bbox_pts))
-
-    x_transf, y_transf = transform_points(
-        from_crs, to_crs, bbox_smoothed[:, 0], bbox_smoothed[:, 1]
-    )
-
-    l_transf, r_transf, b_transf, t_transf = (
-        np.min(x_transf),
-        np.max(x_transf),
-        np.min(y_transf),
-        np.max(y_transf),
-    )
+    l_transf, b_transf, r_transf, t_transf = transform_bboxes(
+        from_crs, to_crs, [bbox], **kwargs
+    )[0]
     return l_transf, b_transf, r_transf, t_transf
 
 
+_compass_dirs = {'N': (0, 1), 'E': (1, 0)}
+
+def _deviations(proj, x, y, xy_units, compasses=('N', 'E'), eps_ll=1e-9):
+    """
+    Deviations (radians) of the given compass directions, stacked along
+    a new first axis. All vector heads are transformed in one call.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    for compass in compasses:
+        if compass not in _compass_dirs:
+            raise ValueError
+
+    if xy_units == 'xy':
+        vector_orig_x = x
+        vector_orig_y = y
+        vector_orig_lon, vector_orig_lat = (a.reshape(x.shape) for a in transform_points(
+            proj, _plate_carree, x.ravel(), y.ravel()))
+    elif xy_units == 'lonlat':
+        vector_orig_lon = x
+        vector_orig_lat = y
+        vector_orig_x = vector_orig_y = None
+    else:
+        raise ValueError
+
+    vector_dirs = [_compass_dirs[c] for c in compasses]
+    lons = [vector_orig_lon + eps_ll * d[0] for d in vector_dirs]
+    lats = [vector_orig_lat + eps_ll * d[1] for d in vector_dirs]
+    if vector_orig_x is None:
+        # transform origins along with the heads
+        lons.insert(0, vector_orig_lon)
+        lats.insert(0, vector_orig_lat)
+    lons, lats = np.stack(lons), np.stack(lats)
+    # cartopy only takes 1-D or 2-D input
+    xs, ys = (a.reshape(lons.shape) for a in transform_points(
+        _plate_carree, proj, lons.ravel(), lats.ravel()))
+    if vector_orig_x is None:
+        vector_orig_x, vector_orig_y = xs[0], ys[0]
+        xs, ys = xs[1:], ys[1:]
+
+    return np.stack([
+        (
+            np.arctan2(vector_head_y-vector_orig_y, vector_head_x-vector_orig_x) -
+            np.arctan2(d[1], d[0])
+        ) % (2*np.pi)
+        for vector_head_x, vector_head_y, d in zip(xs, ys, vector_dirs)
+    ])
+
+
 def calculate_deviation(proj, compass, x, y, xy_units, eps_ll=1e-9):
     """
     Calculate deviation of local x/y direction from north/east direction.
@@ -51,7 +150,7 @@ def calculate_deviation(proj, compass, x, y, xy_units, eps_ll=1e-9):
     or, equivalently, array([[cos(dev), -sin(dev)], [sin(dev), cos(dev)]]) @ array([u, v]).
 
     In practice, deviation of North and East will vary, but not too much if the projection is
-    appropriate for the data.
+    appropriate for the data. See also GridRotation.
 
     Arguments
     ---------
@@ -65,32 +164,89 @@ def calculate_deviation(proj, compass, x, y, xy_units, eps_ll=1e-9):
     -------
         deviation theta (radians)
     """
-    if compass == 'N':
-        vector_dir = (0, 1)
-    elif compass == 'E':
-        vector_dir = (1, 0)
-    else:
-        raise ValueError
+    return _deviations(proj, x, y, xy_units, compasses=(compass,), eps_ll=eps_ll)[0]
 
-    plate_carree = ccrs.PlateCarree()
 
-    if xy_units == 'xy':
-        vector_orig_x = x
-        vector_orig_y = y
-        vector_orig_lon, vector_orig_lat = transform_points(proj, plate_carree, x, y)
-    elif xy_units == 'lonlat':
-        vector_orig_lon = x
-        vector_orig_lat = y
-        vector_orig_x, vector_orig_y = transform_points(plate_carree, proj, x, y)
+class GridRotation:
+    """
+    Rotate east/north vector components (u, v) into the x/y directions of a
+    projection, for one fixed grid.
 
-    vector_head_lat = vector_orig_lat + eps_ll * vector_dir[1]
-    vector_head_lon = vector_orig_lon + eps_ll * vector_dir[0]
+    North and east deviations (see calculate_deviation) are computed once,
+    lazily, and reused for every call, e.g. for every output time step.
+    East and north are rotated separately:
+    (up, vp) = u*(cos(theta_E), sin(theta_E)) + v*(-sin(theta_N), cos(theta_N)).
 
-    vector_head_x, vector_head_y = transform_points(plate_carree, proj, vector_head_lon, vector_head_lat)
+    Arguments
+    ---------
+        proj: Cartopy CRS
+        x, y: numpy/dask arrays or xarray DataArrays with coordinates
+        xy_units: str {'lonlat', 'xy'}
+        eps_ll: small longitude/latitude values to create local vectors
 
-    deviation = (
-        np.arctan2(vector_head_y-vector_orig_y, vector_head_x-vector_orig_x) -
-        np.arctan2(vector_dir[1], vector_dir[0])
-    ) % (2*np.pi)
+    Usage
+    -----
+    rot = GridRotation(ccrs.NorthPolarStereo(), ds.lon, ds.lat, 'lonlat')
+    ds['up'], ds['vp'] = rot.rotate(ds.u, ds.v)
 
-    return deviation
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    def __init__(self, proj, x, y, xy_units, eps_ll=1e-9):
+        self.proj = proj
+        self.x, self.y = x, y
+        self.xy_units = xy_units
+        self.eps_ll = eps_ll
+        self._cos_sin = None
+
+    def _compute(self, x, y):
+        return _deviations(self.proj, x, y, self.xy_units, eps_ll=self.eps_ll)
+
+    @property
+    def deviations(self):
+        """
+        North and east deviations, stacked along a new first axis.
+        """
+        x, y = self.x, self.y
+        if hasattr(x, 'dims'):
+            import xarray as xr
+            x, y = xr.broadcast(x, y)
+            # apply_ufunc wants the new core dim last
+            dev = xr.apply_ufunc(
+                lambda x, y: np.moveaxis(self._compute(x, y), 0, -1), x, y,
+                output_core_dims=[['compass']],
+                dask='parallelized', output_dtypes=[float],
+                dask_gufunc_kwargs=dict(output_sizes={'compass': 2}),
+            )
+            return dev.assign_coords(compass=['N', 'E']).transpose('compass', ...)
+        elif hasattr(x, 'dask'):
+            import dask.array as dsa
+            x, y = dsa.broadcast_arrays(x, y)
+            return dsa.map_blocks(
+                self._compute, x, y, new_axis=0,
+                chunks=((2,),) + x.chunks, dtype=float,
+            )
+        return self._compute(x, y)
+
+    @property
+    def cos_sin(self):
+        """
+        cos(theta_E), sin(theta_E), sin(theta_N), cos(theta_N), cached
+        """
+        if self._cos_sin is None:
+            dev = self.deviations
+            dev_n, dev_e = dev[0], dev[1]
+            self._cos_sin = (np.cos(dev_e), np.sin(dev_e), np.sin(dev_n), np.cos(dev_n))
+            if hasattr(dev, 'dims'):
+                self._cos_sin = tuple(a.drop_vars('compass') for a in self._cos_sin)
+        return self._cos_sin
+
+    def rotate(self, u, v):
+        """
+        Rotate east/north components u, v (arrays or DataArrays broadcastable
+        against the grid) to the projection's x/y directions.
+        """
+        cos_e, sin_e, sin_n, cos_n = self.cos_sin
+        return u*cos_e - v*sin_n, u*sin_e + v*cos_n
@@ -1,23 +1,189 @@
 from typing import List
+from collections import OrderedDict
+import hashlib
+import pickle
 from scipy.spatial import cKDTree
 import numpy as np
 
 # need to sort out geometry vs. attr vs dict entry/column,
 # and dataset vs dataframe!!
 
-def _build_tree(d1, d2, x, y):
-    n1 = np.array(list(zip(d1[x], d1[y])) )
-    n2 = np.array(list(zip(d2[x], d2[y])) )
-    btree = cKDTree(n2)
-    return btree, n1, n2
+def _points(d, x, y):
+    """
+    (N, 2) float array of the x, y columns of d,
+    or of its point geometries if x and y are None.
+    """
+    if x is None and y is None:
+        xs, ys = d.geometry.x, d.geometry.y
+    else:
+        xs, ys = d[x], d[y]
+    return np.column_stack((np.asarray(xs, dtype=float), np.asarray(ys, dtype=float)))
+
+
+class SpatialIndex:
+    """
+    KD-tree over the points of a dataframe, to be built once and then queried
+    repeatedly and in batches. Picklable; see also save/load.
+
+    Parameters
+    ----------
+    d : pandas dataframe or geopandas geodataframe
+    x, y : Names of x and y columns, or None to use the point geometries
+
+    Usage
+    -----
+    index = SpatialIndex(stations, x='lon', y='lat')
+    dist, idx = index.nearest(satellite_pass)
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    def __init__(self, d, x='lon', y='lat'):
+        self.x, self.y = x, y
+        self.points = _points(d, x, y)
+        self.tree = cKDTree(self.points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def _query_points(self, d):
+        if isinstance(d, np.ndarray):
+            return d
+        return _points(d, self.x, self.y)
+
+    def nearest(self, d, k=1, workers=-1, **kwargs):
+        """
+        For each point in d (dataframe or (N, 2) array), find nearest k points
+        in the index. Returns distances and indices, as cKDTree.query.
+        """
+        return self.tree.query(self._query_points(d), k=k, workers=workers, **kwargs)
+
+    def points_within(self, d, radius, workers=-1, **kwargs):
+        """
+        For each point in d (dataframe or (N, 2) array), find all points
+        of the index within given radius. Returns array of index lists.
+        """
+        return self.tree.query_ball_point(
+            self._query_points(d), r=radius, workers=workers, **kwargs
+        )
+
+    def save(self, fname):
+        with open(fname, 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, fname):
+        with open(fname, 'rb') as f:
+            return pickle.load(f)
+
+
+EARTH_RADIUS = 6371008.8 # mean radius in metres
+
+def lonlat_to_xyz(lon, lat):
+    """
+    Convert lon, lat (degrees) to (N, 3) ECEF coordinates on the unit sphere.
+    """
+    lon, lat = np.radians(lon), np.radians(lat)
+    coslat = np.cos(lat)
+    return np.column_stack((coslat*np.cos(lon), coslat*np.sin(lon), np.sin(lat)))
+
+def chord_to_distance(chord, radius=EARTH_RADIUS):
+    """
+    Great-circle distance for a chord length on the unit sphere.
+    """
+    chord = np.asarray(chord, dtype=float)
+    with np.errstate(invalid='ignore'):
+        dist = 2*radius*np.arcsin(np.clip(chord/2, 0, 1))
+    return np.where(np.isfinite(chord), dist, np.inf)
+
+def distance_to_chord(dist, radius=EARTH_RADIUS):
+    """
+    Chord length on the unit sphere for a great-circle distance.
+    """
+    return 2*np.sin(np.minimum(np.asarray(dist, dtype=float)/(2*radius), np.pi/2))
+
+
+class GeodesicIndex(SpatialIndex):
+    """
+    SpatialIndex for lon/lat data with great-circle distances in metres.
+
+    Points are stored as 3-D unit vectors, so the KD-tree works across the
+    antimeridian and near the poles; chord lengths are converted to metres.
+    Queries take dataframes or (N, 2) arrays of lon, lat.
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    def __init__(self, d, x='lon', y='lat', radius=EARTH_RADIUS):
+        self.x, self.y = x, y
+        self.radius = radius
+        lonlat = _points(d, x, y)
+        self.points = lonlat_to_xyz(lonlat[:, 0], lonlat[:, 1])
+        self.tree = cKDTree(self.points)
+
+    def _query_points(self, d):
+        lonlat = super()._query_points(d)
+        return lonlat_to_xyz(lonlat[:, 0], lonlat[:, 1])
+
+    def nearest(self, d, k=1, workers=-1, **kwargs):
+        """
+        For each point in d, find nearest k points in the index.
+        Returns distances (metres) and indices, as cKDTree.query.
+        """
+        if 'distance_upper_bound' in kwargs:
+            kwargs['distance_upper_bound'] = distance_to_chord(
+                kwargs['distance_upper_bound'], self.radius)
+        chord, idx = super().nearest(d, k=k, workers=workers, **kwargs)
+        return chord_to_distance(chord, self.radius), idx
+
+    def points_within(self, d, radius, workers=-1, **kwargs):
+        """
+        For each point in d, find all points of the index within
+        given radius (metres). Returns array of index lists.
+        """
+        return super().points_within(
+            d, distance_to_chord(radius, self.radius), workers=workers, **kwargs
+        )
 
-def nearest(d1, d2, x='lon', y='lat'):
+
+_spatial_index_cache = OrderedDict()
+
+def get_spatial_index(d, x='lon', y='lat', geodesic=False, maxsize=8):
+    """
+    Return a SpatialIndex (GeodesicIndex if geodesic) for d, reusing a cached
+    one if the same points have been indexed before (the maxsize most recently
+    used are kept).
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    pts = _points(d, x, y)
+    key = (x, y, geodesic, pts.shape, hashlib.sha1(pts.tobytes()).hexdigest())
+    if key in _spatial_index_cache:
+        _spatial_index_cache.move_to_end(key)
+        return _spatial_index_cache[key]
+    index = GeodesicIndex(d, x, y) if geodesic else SpatialIndex(d, x, y)
+    _spatial_index_cache[key] = index
+    while len(_spatial_index_cache) > maxsize:
+        _spatial_index_cache.popitem(last=False)
+    return index
+
+def nearest(d1, d2, x='lon', y='lat', geodesic=False):
     """
     For each point in d1, find nearest point in d2.
 
     Parameters
     ----------
-    d1, d2 : pandas dataframes
+    d1 : pandas dataframe
+    d2 : pandas dataframe or SpatialIndex
+    geodesic : bool, if True, x/y are lon/lat and distances are great-circle
+        distances in metres
 
     Returns
     -------
@@ -29,16 +195,20 @@ def nearest(d1, d2, x='lon', y='lat'):
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
         """
-    btree, n1, _ = _build_tree(d1, d2, x, y)
-    return btree.query(n1, k=1)
+    if not isinstance(d2, SpatialIndex):
+        d2 = get_spatial_index(d2, x, y, geodesic=geodesic)
+    return d2.nearest(_points(d1, x, y), k=1)
 
-def points_within(d1, d2, radius, x='lon', y='lat'):
+def points_within(d1, d2, radius, x=None, y=None, geodesic=False):
     """
     For each point in d1, find all points of d2 within given radius
 
     Parameters
     ----------
-    d1, d2 : pandas dataframes
+    d1 : pandas dataframe
+    d2 : pandas dataframe or SpatialIndex
+    x, y : Names of x and y columns, or None to use the point geometries
+    geodesic : bool, if True, x/y are lon/lat and radius is in metres
 
     Returns
     -------
@@ -49,29 +219,80 @@ def points_within(d1, d2, radius, x='lon', y='lat'):
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    n1 = np.array(list(zip(d1.geometry.x, d1.geometry.y)) )
-    n2 = np.array(list(zip(d2.geometry.x, d2.geometry.y)) )
-    btree = cKDTree(n2)
-    idx = btree.query_ball_point(n1, r=radius)
-    return idx
+    if not isinstance(d2, SpatialIndex):
+        d2 = get_spatial_index(d2, x, y, geodesic=geodesic)
+    return d2.points_within(_points(d1, x, y), radius)
+
+def _epoch_days(times):
+    return (np.asarray(times, dtype='datetime64[ns]') - np.datetime64('1900-01-01'))/np.timedelta64(1, 'D')
+
+def _space_time_matches(tree, pts2, t2, pts1, t1, scale, dist_tol, t_tol, k):
+    """
+    For each point (pts1, t1), find the k spatially nearest of (pts2, t2)
+    within dist_tol and t_tol, using a KD-tree over (x, y, t*scale).
+
+    All such matches lie within a ball of radius sqrt(2)*dist_tol in the
+    scaled space. Candidates from that ball are filtered in vectorized form;
+    rows whose candidate list may have been truncated are re-queried with
+    twice as many candidates.
+
+    Returns (n, k) arrays of indices (len(pts2) where missing) and distances.
+    """
+    n, m = len(pts1), len(pts2)
+    q = np.column_stack((pts1, t1*scale))
+    r = np.sqrt(2)*dist_tol*(1 + 1e-9)
+
+    idx = np.full((n, k), m)
+    dist = np.full((n, k), np.inf)
+    rows = np.arange(n)
+    kq = max(2*k, 8)
+    while len(rows):
+        kq = min(kq, m)
+        _, cand = tree.query(q[rows], k=kq, distance_upper_bound=r, workers=-1)
+        cand = cand.reshape(len(rows), kq)
+        found = cand < m
+        c = np.where(found, cand, 0)
+        d = np.hypot(*np.moveaxis(pts2[c] - pts1[rows, np.newaxis], -1, 0))
+        found &= (d <= dist_tol) & (np.abs(t2[c] - t1[rows, np.newaxis]) <= t_tol)
+        d = np.where(found, d, np.inf)
+
+        done = (cand[:, -1] == m) | (kq == m)
+        order = np.argsort(d[done], axis=1)[:, :k]
+        d_done = np.take_along_axis(d[done], order, axis=1)
+        c_done = np.take_along_axis(c[done], order, axis=1)
+        kk = order.shape[1]
+        idx[rows[done], :kk] = np.where(np.isfinite(d_done), c_done, m)
+        dist[rows[done], :kk] = d_done
+
+        rows = rows[~done]
+        kq *= 2
+    return idx, dist
 
-def nearest_with_time_constraint(d1, d2, x, y, dist_tol=.1, t='date', t_tol=1):
+def nearest_with_time_constraint(d1, d2, x, y, dist_tol=.1, t='date', t_tol=1,
+                                 k=1, chunksize=1000000):
     """
     For each point in d1, find nearest point in d2,
     and return a boolean index that is True iff their distance is less
     than dist_tol and they are not further apart in time than t_tol days.
     Confused yet?
 
+    The nearest point is searched among those that satisfy both tolerances,
+    with one KD-tree over (x, y, scaled time).
+
     Parameters
     ----------
     d1, d2 : pandas dataframes
     dist_tol : float, units given by x, y
-    t_tol : floats, allowed time difference in days
+    t_tol : floats, allowed time difference in days (0 for equal times)
     x, y : Names of x and y columns
+    k : int, number of nearest matches to return for each point in d1
+    chunksize : int, number of d1 rows processed at a time
 
     Returns
     -------
-    nearest :
+    nearest : indices into d2. With k=1, where there is no match, the
+        spatially nearest point regardless of tolerances. With k>1, an (N, k)
+        array where missing matches are given by len(d2).
     within_tol : bool array, True of nearest neighbour within dist_tol and t_tol
 
     License
@@ -79,47 +300,134 @@ def nearest_with_time_constraint(d1, d2, x, y, dist_tol=.1, t='date', t_tol=1):
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    n1 = np.array(list(zip(d1[x], d1[y])) )
-    n2 = np.array(list(zip(d2[x], d2[y])) )
-    tree_spatial = cKDTree(n2)
-    distances, nearest = tree_spatial.query(n1)
+    pts1, pts2 = _points(d1, x, y), _points(d2, x, y)
+    t1, t2 = _epoch_days(d1[t]), _epoch_days(d2[t])
+
+    # relative times, for precision with the large scale below
+    t0 = min(np.nanmin(t1, initial=np.inf), np.nanmin(t2, initial=np.inf))
+    if np.isfinite(t0):
+        t1, t2 = t1 - t0, t2 - t0
+
+    # scale time such that t_tol corresponds to dist_tol
+    if t_tol > 0:
+        scale = dist_tol/t_tol
+    else:
+        # exact-time matches: any nonzero time difference (>= 1 ns) lies
+        # outside the search ball
+        scale = 2*dist_tol*86400e9
+    tree = cKDTree(np.column_stack((pts2, t2*scale)))
 
-    # for each point in d1, find all points in d2 within ttol days
-    t1_epoch_days = (d1[t].values[:, np.newaxis] - np.datetime64('1900-01-01'))/np.timedelta64(1, 'D')
-    t2_epoch_days = (d2[t].values[:, np.newaxis] - np.datetime64('1900-01-01'))/np.timedelta64(1, 'D')
-    tree_tmp = cKDTree(t2_epoch_days)
-    within_t_tol = tree_tmp.query_ball_point(t1_epoch_days, r=t_tol) # array of lists of pot. candidates
+    nearest = np.empty((len(pts1), k), dtype=int)
+    for i in range(0, len(pts1), chunksize):
+        sl = slice(i, i+chunksize)
+        nearest[sl], _ = _space_time_matches(
+            tree, pts2, t2, pts1[sl], t1[sl], scale, dist_tol, t_tol, k
+        )
+    within_tol = nearest < len(pts2)
 
-    within_tol = [True if idx in candidates and dist<=dist_tol else False
-                  for idx, dist, candidates
-                  in zip(nearest, distances, within_t_tol)]
+    if k == 1:
+        nearest, within_tol = nearest[:, 0], within_tol[:, 0]
+        if not within_tol.all():
+            _, nearest[~within_tol] = get_spatial_index(d2, x, y).nearest(
+                pts1[~within_tol]
+            )
     return nearest, within_tol
 
 
-def smoothen(coords):
+def smoothen(coords, n=49, max_spacing=None, great_circle=False):
     """
     Insert new points along path defined by coords [(x0, y0), (x1, y1), ...].
 
+    Parameters
+    ----------
+    coords : (N, D) array-like of vertices
+    n : int, number of points per segment (segment start included,
+        segment end excluded)
+    max_spacing : float, optional
+        Instead of n, use as few points per segment as possible such that
+        points are no further apart than this.
+    great_circle : bool
+        Treat coords as (lon, lat) and interpolate along great circles;
+        max_spacing is then in metres.
+
+    Returns
+    -------
+    (M, D) array, including the final vertex
+
     License
     -------
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    newcoords = []
-    for c in zip(*coords): # iterate over each x, y, z, ... separately
-        newc = []
-        for c1, c2 in zip(c[:-1], c[1:]):
-            newc += list(np.linspace(c1, c2, 50)[:-1])
-        newcoords.append(newc)
+    coords = np.asarray(coords, dtype=float)
+    if len(coords) < 2:
+        return coords.copy()
+
+    if great_circle:
+        xyz = lonlat_to_xyz(coords[:, 0], coords[:, 1])
+        a, b = xyz[:-1], xyz[1:]
+        omega = 2*np.arcsin(np.clip(np.linalg.norm(b - a, axis=1)/2, 0, 1))
+        seg_len = omega*EARTH_RADIUS
+    else:
+        a, b = coords[:-1], coords[1:]
+        seg_len = np.linalg.norm(b - a, axis=1)
+
+    if max_spacing is None:
+        k = np.full(len(a), n)
+    else:
+        k = np.maximum(np.ceil(seg_len/max_spacing), 1).astype(int)
+
+    # segment and fractional position of each new point
+    seg = np.repeat(np.arange(len(a)), k)
+    offsets = np.concatenate([[0], np.cumsum(k)[:-1]])
+    t = ((np.arange(len(seg)) - offsets[seg])/k[seg])[:, np.newaxis]
 
-    newcoords = [(x,y) for x, y in zip(*newcoords)]
-    return newcoords
+    if great_circle:
+        w = omega[seg][:, np.newaxis]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_w = np.sin(w)
+            fa = np.where(sin_w > 0, np.sin((1 - t)*w)/sin_w, 1 - t)
+            fb = np.where(sin_w > 0, np.sin(t*w)/sin_w, t)
+        p = fa*a[seg] + fb*b[seg]
+        lon = np.degrees(np.arctan2(p[:, 1], p[:, 0]))
+        lat = np.degrees(np.arctan2(p[:, 2], np.hypot(p[:, 0], p[:, 1])))
+        # any further dimensions are interpolated linearly
+        rest = coords[:-1, 2:][seg] + t*np.diff(coords[:, 2:], axis=0)[seg]
+        newcoords = np.column_stack((lon, lat, rest))
+    else:
+        newcoords = a[seg] + t*(b - a)[seg]
+
+    return np.concatenate([newcoords, coords[-1:]])
+
+
+def find_nearest_lonlat_many(lons0, lats0, lons, lats):
+    """For each point (lon0, lat0), find the nearest point among list(zip(lons, lats)).
+
+    Uses a (cached) GeodesicIndex, i.e. great-circle distances.
+
+    Returns:
+        nearest lons
+        nearest lats
+        distances to nearest (metres)
+        indices in `lons` and `lats`
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    import pandas as pd
+    lons, lats = np.asarray(lons), np.asarray(lats)
+    index = get_spatial_index(pd.DataFrame({'lon': lons, 'lat': lats}), geodesic=True)
+    lonlat0 = np.column_stack((np.ravel(lons0), np.ravel(lats0))).astype(float)
+    dist, idx = index.nearest(lonlat0)
+    return lons[idx], lats[idx], dist, idx
 
 
 def find_nearest_lonlat(lon0: float, lat0: float, lons: List[float], lats: List[float]):
     """Find the point nearest to (lon0, lat0) among the points list(zip(lons, lats)).
 
-    Automatically chooses appropriate UTM zone for coordinate transformations.
+    Distances are great-circle distances in metres, see find_nearest_lonlat_many.
 
     Returns:
         nearest lon
@@ -132,19 +440,5 @@ def find_nearest_lonlat(lon0: float, lat0: float, lons: List[float], lats: List[
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    from cartopy.crs import UTM, PlateCarree
-    import utm
-    from scipy.spatial import KDTree
-    import numpy as np
-
-    _, _, zone, letter = utm.from_latlon(latitude=lat0, longitude=lon0)
-    crs = UTM(zone)
-    x, y = crs.transform_point(lon0, lat0, PlateCarree())
-    xyz = crs.transform_points(PlateCarree(), np.array(lons), np.array(lats))
-    pts = xyz[:, :2]
-
-    tree = KDTree(pts)
-    dist, idx = tree.query((x, y))
-    lon = lons[idx]
-    lat = lats[idx]
-    return lon, lat, dist, idx
+    lon, lat, dist, idx = find_nearest_lonlat_many([lon0], [lat0], lons, lats)
+    return lon[0], lat[0], dist[0], idx[0]
@@ -41,19 +41,28 @@ def _create_column_header(d):
     return s.translate(_sanitize_units).replace(' ', '_')
 
 def _to_dframe(e):
-    translate_dimensions_dict = {
-            d.name: _create_column_header(d)
-            for d in e.dimensions() if d.label is not None
-        }
-    dims = [d.name for d in e.dimensions()[:2]]
-    df = e.dframe().dropna(subset=dims, how='any')
+    """
+    DataFrame of an element's dimension values, with descriptive headers.
+    Columns are taken from dimension_values without further copies.
+    """
+    dims = e.dimensions()
+    headers = [
+        _create_column_header(d) if d.label is not None else d.name
+        for d in dims
+    ]
+    df = pd.DataFrame(
+        {h: e.dimension_values(d) for h, d in zip(headers, dims)}, copy=False
+    )
     # df = df.assign(Element=e.group)
-    return df.rename(columns=translate_dimensions_dict)
+    return df.dropna(subset=headers[:2], how='any')
 
 def get_all_data(obj):
     """
     Produce pandas DataFrame from any holoviews object.
 
+    Data of elements with identical columns are stacked with a single concat,
+    and these groups are then outer-joined on their shared columns.
+
     License
     -------
     GNU-GPLv3, (C) A. R.
@@ -68,7 +77,31 @@ def get_all_data(obj):
     # should be unique w/r/t values they represent...
     # df_list = [df.assign(Frame=i) for i, df in enumerate(df_list)]
 
-    return reduce(lambda df1, df2: df1.merge(df2, how='outer'), df_list)
+    groups = {}
+    for df in df_list:
+        groups.setdefault(tuple(df.columns), []).append(df)
+    frames = [pd.concat(dfs, ignore_index=True) for dfs in groups.values()]
+
+    return reduce(lambda df1, df2: df1.merge(df2, how='outer'), frames)
+
+def save_all_data(obj, fname):
+    """
+    Write the output of get_all_data(obj) to a parquet or feather/arrow file,
+    depending on the extension of fname.
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    df = get_all_data(obj).reset_index(drop=True)
+    if fname.endswith('.parquet'):
+        df.to_parquet(fname)
+    elif fname.endswith(('.feather', '.arrow')):
+        df.to_feather(fname)
+    else:
+        raise ValueError('fname must end in .parquet, .feather or .arrow')
+    return fname
 
 ### aggregate & compare vdims over a number of elements
 
@@ -79,38 +112,128 @@ import datashader as dsh
 # from datashader import transfer_functions as tf
 # import reductions as rd
 
-def agg_vdims(elements, vdims=None, N=100):
+def _accumulate_numpy(sums, counts, coords, values, edges):
+    """
+    Add values into flat sum and count grids, given their coordinates.
+    """
+    N = [len(ed) - 1 for ed in edges]
+    valid = ~np.isnan(values)
+    idx = []
+    for c, ed, n in zip(coords, edges, N):
+        valid &= (c >= ed[0]) & (c <= ed[-1])
+        # right edge of last bin is inclusive
+        idx.append(np.clip(np.searchsorted(ed, c, side='right') - 1, 0, n - 1))
+    flat = np.ravel_multi_index([i[valid] for i in idx], N)
+    sums += np.bincount(flat, weights=values[valid], minlength=sums.size)
+    counts += np.bincount(flat, minlength=counts.size)
+
+def _accumulate_datashader(sums, counts, coords, values, edges):
+    """
+    Same as _accumulate_numpy, using datashader (2 kdims only).
+    """
+    (x0, x1), (y0, y1) = ((ed[0], ed[-1]) for ed in edges)
+    cvs = dsh.Canvas(plot_width=len(edges[0]) - 1, plot_height=len(edges[1]) - 1,
+                     x_range=(x0, x1), y_range=(y0, y1))
+    df = pd.DataFrame({'x': coords[0], 'y': coords[1], 'v': values})
+    agg = cvs.points(df, 'x', 'y', agg=dsh.summary(s=dsh.sum('v'), n=dsh.count('v')))
+    # datashader grids are (y, x)
+    sums += np.nan_to_num(agg['s'].values.T).ravel()
+    counts += agg['n'].values.T.ravel()
+
+def _numeric_values(values):
+    # datetimes as float ns, NaT as NaN
+    if values.dtype.kind == 'M':
+        ns = values.astype('datetime64[ns]')
+        return np.where(np.isnat(ns), np.nan, ns.astype('i8').astype(float))
+    return values.astype(float)
+
+def _bin_centres(edges, is_dt=False):
+    centres = edges[:-1] + np.diff(edges)/2
+    if is_dt:
+        centres = np.round(centres).astype('i8').astype('datetime64[ns]')
+    return centres
+
+def agg_vdims(elements, vdims=None, N=100, backend='numpy', as_dataframe=False):
     """
     Spatially aggregate vdims from a number of holoviews Elements.
 
+    Elements are streamed one by one into fixed sum and count grids over
+    the combined range of their kdims, so memory use does not grow with the
+    number of elements.
+
     Parameters:
     -----------
     elements : list
         List of holoviews Elements
     vdims : list
         List of vdim names over which to aggregate for each Element
+        (default: all vdims of each Element)
     N : int
         Number of bins (in each kdim) to aggegrate
+    backend : {'numpy', 'datashader'}
+        datashader requires exactly two kdims
+    as_dataframe : bool
+        Return a DataFrame indexed by the bin centres of non-empty bins,
+        instead of an xarray Dataset
+
+    Returns
+    -------
+    xarray Dataset with bin-mean of each vdim, on the grid of bin centres
+    (named after the kdims of the first Element)
 
     License
     -------
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    data = []
+    import xarray as xr
+
+    if backend not in ['numpy', 'datashader']:
+        raise ValueError(f'backend must be one of numpy, datashader, not {backend}')
+    accumulate = {
+        'numpy': _accumulate_numpy,
+        'datashader': _accumulate_datashader,
+    }[backend]
+
     kdims0 = [kd.name for kd in elements[0].kdims]
+    if backend == 'datashader' and len(kdims0) != 2:
+        raise ValueError('datashader backend needs exactly two kdims')
+
+    is_dt = [elements[0].dimension_values(i).dtype.kind == 'M'
+             for i in range(len(kdims0))]
+
+    # first pass: common extent of all elements
+    edges = []
+    for i in range(len(kdims0)):
+        lo, hi = zip(*(
+            (np.nanmin(c), np.nanmax(c)) if len(c) else (np.nan, np.nan)
+            for c in (_numeric_values(e.dimension_values(i)) for e in elements)
+        ))
+        edges.append(np.linspace(np.nanmin(lo), np.nanmax(hi), N+1))
+    shape = tuple(len(ed) - 1 for ed in edges)
+
+    # second pass: accumulate each element
+    sums, counts = {}, {}
     for k, e in enumerate(elements):
         if vdims is None:
-            vdim = e.vdims[0].name
+            names = [vd.name for vd in e.vdims]
         else:
-            vdim = vdims[k]
-        kdims = [kd.name for kd in e.kdims]
-        dims = [d.name for d in e.dimensions()]
-        data.append(
-            e.data[dims].rename(columns={kd: kd0 for kd, kd0 in zip(kdims, kdims0)}).copy()
+            names = [vdims[k]]
+        coords = [_numeric_values(e.dimension_values(kd)) for kd in e.kdims]
+        for v in names:
+            if v not in sums:
+                sums[v] = np.zeros(np.prod(shape))
+                counts[v] = np.zeros(np.prod(shape), dtype=int)
+            accumulate(sums[v], counts[v], coords,
+                       e.dimension_values(v).astype(float), edges)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ds = xr.Dataset(
+            {v: (kdims0, (sums[v]/counts[v]).reshape(shape)) for v in sums},
+            coords={
+                kd: _bin_centres(ed, dt) for kd, ed, dt in zip(kdims0, edges, is_dt)
+            },
         )
-
-    df = pd.concat(data, sort=False).dropna(how='all')
-    for kd in kdims0:
-        df[kd] = pd.IntervalIndex(pd.cut(df[kd], bins=N)).mid
-    return df.groupby(kdims0).mean()
+    if as_dataframe:
+        return ds.to_dataframe().dropna(how='all')
+    return ds
@@ -1,3 +1,5 @@
+import numpy as np
+import pandas as pd
 import param
 import holoviews as hv
 
@@ -7,10 +9,38 @@ from holoviews.element.geom import Geometry
 from holoviews import Store, Dimension
 from holoviews.core.util import max_range
 
+def _columns(element, dims):
+    """
+    Values of dims as arrays, taken from the element's columns without
+    copying where the data are columnar (DataFrame or dict).
+    """
+    data = element.data
+    names = [element.get_dimension(d).name for d in dims]
+    if isinstance(data, pd.DataFrame) and all(n in data.columns for n in names):
+        return [data[n].to_numpy() for n in names]
+    if isinstance(data, dict) and all(n in data for n in names):
+        return [np.asarray(data[n]) for n in names]
+    return [element.dimension_values(d) for d in dims]
+
+def _segment_extents(element):
+    """
+    ((xmin, xmax), (ymin, ymax)) over start and end points of all segments.
+    """
+    x0, y0, x1, y1 = _columns(element, range(4))
+    if not len(x0):
+        return (np.nan, np.nan), (np.nan, np.nan)
+    lo = [np.nanmin(c) for c in (x0, y0, x1, y1)]
+    hi = [np.nanmax(c) for c in (x0, y0, x1, y1)]
+    return (min(lo[0], lo[2]), max(hi[0], hi[2])), (min(lo[1], lo[3]), max(hi[1], hi[3]))
+
 class SegmentPlot(ColorbarPlot):
     """
     Segments are lines in 2D space where each two each dimensions specify a
     (x, y) node of the line.
+
+    Columnar data (DataFrame or dict) are handed to bokeh as they are,
+    without intermediate copies. For very many segments, consider
+    aggregate_segments.
     """
     style_opts = line_properties + ['cmap']
 
@@ -23,14 +53,7 @@ class SegmentPlot(ColorbarPlot):
         x0idx, y0idx, x1idx, y1idx = (
             (1, 0, 3, 2) if self.invert_axes else (0, 1, 2, 3)
         )
-
-        # Compute segments
-        x0s, y0s, x1s, y1s = (
-            element.dimension_values(x0idx),
-            element.dimension_values(y0idx),
-            element.dimension_values(x1idx),
-            element.dimension_values(y1idx)
-        )
+        x0s, y0s, x1s, y1s = _columns(element, [x0idx, y0idx, x1idx, y1idx])
 
         data = {'x0': x0s, 'x1': x1s, 'y0': y0s, 'y1': y1s}
         mapping = dict(x0='x0', x1='x1', y0='y0', y1='y1')
@@ -41,20 +64,20 @@ class SegmentPlot(ColorbarPlot):
         Use first two key dimensions to set names, and all four
         to set the data range.
         """
-        kdims = element.kdims
-        # loop over start and end points of segments
-        # simultaneously in each dimension
-        for kdim0, kdim1 in zip([kdims[i].name for i in range(2)],
-                                [kdims[i].name for i in range(2,4)]):
-            new_range = {}
-            for kdim in [kdim0, kdim1]:
-                # for good measure, update ranges for both start and end kdim
-                for r in ranges[kdim]:
-                    # combine (x0, x1) and (y0, y1) in range calculation
-                    new_range[r] = max_range([ranges[kd][r]
-                                              for kd in [kdim0, kdim1]])
-            ranges[kdim0] = new_range
-            ranges[kdim1] = new_range
+        kdims = [kd.name for kd in element.kdims]
+        ranges = dict(ranges)
+        # combine (x0, x1) and (y0, y1) in range calculation
+        for (kd0, kd1), data_range in zip([kdims[0::2], kdims[1::2]],
+                                          _segment_extents(element)):
+            r0, r1 = ranges.get(kd0, {}), ranges.get(kd1, {})
+            new_range = dict(r0)
+            new_range.update({
+                r: max_range([r0.get(r, (np.nan, np.nan)), r1.get(r, (np.nan, np.nan))])
+                for r in ['hard', 'soft', 'combined']
+            })
+            new_range['data'] = data_range
+            new_range['combined'] = max_range([new_range['combined'], data_range])
+            ranges[kd0] = ranges[kd1] = new_range
         return super(SegmentPlot, self).get_extents(element, ranges, range_type)
 
 
@@ -72,6 +95,61 @@ class Segments(Geometry):
         coordinates in 2D space.""")
 
 
+class aggregate_segments(hv.Operation):
+    """
+    Rasterize Segments with datashader's line aggregation, if there are
+    more than threshold of them; smaller elements are passed through.
+
+    Usage
+    -----
+    To re-aggregate on zoom:
+    aggregate_segments(segments, streams=[hv.streams.RangeXY])
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    threshold = param.Integer(default=100000,
+        doc='Only aggregate elements with more segments than this.')
+
+    aggregator = param.Parameter(default=None,
+        doc='datashader reduction, ds.count() if None.')
+
+    width = param.Integer(default=400, doc='Width of the raster in pixels.')
+
+    height = param.Integer(default=400, doc='Height of the raster in pixels.')
+
+    x_range = param.NumericTuple(default=None, length=2, allow_None=True,
+        doc='x range to aggregate over, data range if None.')
+
+    y_range = param.NumericTuple(default=None, length=2, allow_None=True,
+        doc='y range to aggregate over, data range if None.')
+
+    def _process(self, element, key=None):
+        if len(element) <= self.p.threshold:
+            return element
+        import datashader as ds
+
+        names = [kd.name for kd in element.kdims]
+        if isinstance(element.data, pd.DataFrame):
+            df = element.data
+        else:
+            df = pd.DataFrame(dict(zip(names, _columns(element, range(4)))), copy=False)
+        x_range, y_range = _segment_extents(element)
+        canvas = ds.Canvas(
+            plot_width=self.p.width, plot_height=self.p.height,
+            x_range=self.p.x_range or x_range, y_range=self.p.y_range or y_range,
+        )
+        agg = canvas.line(
+            df, x=names[0::2], y=names[1::2], axis=1,
+            agg=ds.count() if self.p.aggregator is None else self.p.aggregator,
+        )
+        vdim = 'Count' if self.p.aggregator is None else type(self.p.aggregator).__name__
+        agg = agg.rename(x=names[0], y=names[1]).rename(vdim)
+        return hv.Image(agg, kdims=names[:2], vdims=[vdim])
+
+
 hv.Store.register({Segments: SegmentPlot}, 'bokeh')
 hv.Store.set_current_backend('bokeh')
 # works too:
@@ -1,56 +1,288 @@
 import os
-from holoviews import render
+import io
+import re
+import json
+import types
+import functools
+import hashlib
+import pandas as pd
+from holoviews import render, Store, Element
 from bokeh.io import export_svgs
-from bokeh.plotting.figure import Figure
+from bokeh.io.export import get_svgs
+from bokeh.models import Plot
 
-def save_bokeh_svg(obj, fname):
+def _set_svg_backend(plot):
+    for fig in plot.select(dict(type=Plot)):
+        fig.output_backend = 'svg'
+    return plot
+
+def save_bokeh_svg(obj, fname, webdriver=None):
     if not fname[-4:] == '.svg':
         fname += '.svg'
-    plot = render(obj)
-    figs = list(plot.select(dict(type=Figure)))
-    for k, _ in enumerate(figs):
-        figs[k].output_backend = 'svg'
-    return export_svgs(plot, filename=fname)
+    plot = _set_svg_backend(render(obj))
+    return export_svgs(plot, filename=fname, webdriver=webdriver)
 
 from svg_stack import (
     Document, HBoxLayout, VBoxLayout,
     AlignCenter, AlignRight, AlignLeft,
 )
 
-def save_bokeh_svg_multipanel(obj, fname, orientation='h', align='center'):
+_alignment = {
+    'center': AlignCenter,
+    'right': AlignRight,
+    'left': AlignLeft
+}
+
+def stack_svgs(svgs, fname, orientation='h', align='center'):
     """
+    Stack SVG documents given as strings into one file, without going
+    through intermediate files.
+
     Parameters
     ----------
     orientation: {'h', 'v'}
+    align: {'center', 'right', 'left'}
     """
-    if not fname[-4:] == '.svg':
-        fname += '.svg'
-    fname_root = fname[:-4]
-
-    panels = save_bokeh_svg(obj, fname)
-
-    # rename first output; would otherwise clash when using svg_stack
-    os.rename(panels[0], fname_root+'_0.svg')
-    panels[0] = fname_root+'_0.svg'
-
     doc = Document()
     if orientation == 'v':
         layout = VBoxLayout()
     elif orientation == 'h':
         layout = HBoxLayout()
 
-    alignment = {
-        'center': AlignCenter,
-        'right': AlignRight,
-        'left': AlignLeft
-    }
-
-    for panel in panels:
-        layout.addSVG(panel, alignment=AlignRight)
+    for svg in svgs:
+        layout.addSVG(io.BytesIO(svg.encode()), alignment=_alignment[align])
 
     layout.setSpacing(0)
     doc.setLayout(layout)
     doc.save(fname)
+    return fname
+
+def save_bokeh_svg_multipanel(obj, fname, orientation='h', align='center', webdriver=None):
+    """
+    Parameters
+    ----------
+    orientation: {'h', 'v'}
+    """
+    if not fname[-4:] == '.svg':
+        fname += '.svg'
+    plot = _set_svg_backend(render(obj))
+    svgs = get_svgs(plot, driver=webdriver)
+    return stack_svgs(svgs, fname, orientation=orientation, align=align)
+
+
+def _code_repr(code, seen):
+    consts = tuple(
+        _code_repr(c, seen) if isinstance(c, types.CodeType) else _stable_repr(c, seen)
+        for c in code.co_consts
+    )
+    return repr((code.co_code, consts, code.co_names))
+
+def _stable_repr(value, seen=None):
+    """
+    repr without memory addresses, so that it is the same across sessions:
+    callables by qualified name plus their bytecode, constants, defaults and
+    closure (so that editing a hook changes it), colormaps and the like by
+    their name.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return '<recursion>'
+    if isinstance(value, dict):
+        seen = seen | {id(value)}
+        items = sorted(value.items(), key=lambda kv: repr(kv[0]))
+        return '{%s}' % ', '.join(f'{k!r}: {_stable_repr(v, seen)}' for k, v in items)
+    if isinstance(value, (list, tuple)):
+        seen = seen | {id(value)}
+        return '%s(%s)' % (
+            type(value).__name__, ', '.join(_stable_repr(v, seen) for v in value))
+    if isinstance(value, functools.partial):
+        seen = seen | {id(value)}
+        return 'partial(%s)' % ', '.join(
+            _stable_repr(v, seen) for v in (value.func, value.args, value.keywords))
+    if callable(value) and hasattr(value, '__qualname__'):
+        seen = seen | {id(value)}
+        out = f'{getattr(value, "__module__", None)}.{value.__qualname__}'
+        func = getattr(value, '__func__', value)
+        code = getattr(func, '__code__', None)
+        if code is not None:
+            closure = []
+            for cell in func.__closure__ or ():
+                try:
+                    closure.append(cell.cell_contents)
+                except ValueError:  # empty cell
+                    closure.append(None)
+            out += '(%s)' % ', '.join([
+                _code_repr(code, seen),
+                _stable_repr(func.__defaults__, seen),
+                _stable_repr(func.__kwdefaults__, seen),
+                _stable_repr(tuple(closure), seen),
+            ])
+        return out
+    if isinstance(getattr(value, 'name', None), str):
+        return f'{type(value).__name__}({value.name})'
+    return re.sub(r' at 0x[0-9a-fA-F]+', '', repr(value))
+
+
+class SVGExporter:
+    """
+    Export many holoviews objects to SVG with one headless browser session.
+
+    Parameters
+    ----------
+    cache : str, optional
+        JSON file in which the content hash of each exported object is kept.
+        Objects whose hash has not changed since the last export to the same
+        (existing) file name are skipped.
+
+    Usage
+    -----
+    with SVGExporter(cache='figures.json') as exporter:
+        exporter.export({'fig1.svg': obj1, 'fig2.svg': obj2}, multipanel=True)
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    def __init__(self, webdriver=None, cache=None):
+        self._webdriver = webdriver
+        self._owns_webdriver = webdriver is None
+        self.cache = cache
+        self.hashes = {}
+        if cache is not None and os.path.exists(cache):
+            with open(cache) as f:
+                self.hashes = json.load(f)
+
+    @property
+    def webdriver(self):
+        if self._webdriver is None:
+            from bokeh.io.webdriver import webdriver_control
+            self._webdriver = webdriver_control.create()
+        return self._webdriver
+
+    def close(self):
+        if self._owns_webdriver and self._webdriver is not None:
+            # via bokeh, which would otherwise quit it again at exit
+            from bokeh.io.webdriver import webdriver_control
+            webdriver_control.terminate(self._webdriver)
+        self._webdriver = None
+        self._save_cache()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _save_cache(self):
+        if self.cache is not None:
+            with open(self.cache, 'w') as f:
+                json.dump(self.hashes, f, indent=1)
+
+    @staticmethod
+    def content_hash(obj, **kwargs):
+        """
+        Hash of the data, dimensions and options of obj and its children
+        (object ids do not enter, unlike with pickle).
+        """
+        h = hashlib.sha1(_stable_repr(kwargs).encode())
+        backend = Store.current_backend
+
+        def update(o):
+            h.update(repr((type(o).__name__, o.group, o.label,
+                           getattr(o, '_max_cols', None))).encode())
+            for group in ['plot', 'style', 'norm']:
+                opts = Store.lookup_options(backend, o, group).kwargs
+                h.update(_stable_repr(opts).encode())
+            if isinstance(o, Element):
+                for d in o.dimensions():
+                    h.update(repr((d.name, d.label, d.unit)).encode())
+                    h.update(pd.util.hash_array(o.dimension_values(d)).tobytes())
+
+        obj.traverse(update)
+        return h.hexdigest()
+
+    def is_unchanged(self, obj, fname, content_hash=None, **kwargs):
+        if content_hash is None:
+            content_hash = self.content_hash(obj, **kwargs)
+        return os.path.exists(fname) and self.hashes.get(fname) == content_hash
+
+    def save(self, obj, fname, multipanel=False, content_hash=None, **kwargs):
+        """
+        Export obj to fname, as save_bokeh_svg or (if multipanel)
+        save_bokeh_svg_multipanel with kwargs. Returns None if skipped.
+        content_hash can be passed if already known.
+        """
+        if not fname[-4:] == '.svg':
+            fname += '.svg'
+        if content_hash is None:
+            content_hash = self.content_hash(obj, multipanel=multipanel, **kwargs)
+        if self.is_unchanged(obj, fname, content_hash):
+            return None
+        if multipanel:
+            out = save_bokeh_svg_multipanel(obj, fname, webdriver=self.webdriver, **kwargs)
+        else:
+            out = save_bokeh_svg(obj, fname, webdriver=self.webdriver)
+        self.hashes[fname] = content_hash
+        return out
+
+    def export(self, objs, multipanel=False, processes=None, **kwargs):
+        """
+        Export several objects.
+
+        Parameters
+        ----------
+        objs : dict of {fname: holoviews object}
+        processes : int, optional
+            Export in a pool of this many processes (0 for one per CPU),
+            each with its own browser session. Objects must be picklable.
+
+        Returns
+        -------
+        dict of {fname: output}, output is None for skipped objects
+        """
+        objs = {
+            (f if f[-4:] == '.svg' else f + '.svg'): obj for f, obj in objs.items()
+        }
+        hashes = {
+            f: self.content_hash(obj, multipanel=multipanel, **kwargs)
+            for f, obj in objs.items()
+        }
+        todo = {
+            f: obj for f, obj in objs.items()
+            if not self.is_unchanged(obj, f, hashes[f])
+        }
+        if processes is None or processes == 1 or len(todo) < 2:
+            out = {f: self.save(obj, f, multipanel=multipanel,
+                                content_hash=hashes[f], **kwargs)
+                   for f, obj in todo.items()}
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(
+                max_workers=processes or None,
+                initializer=_init_worker,
+            ) as executor:
+                futures = {
+                    f: executor.submit(_export_in_worker, obj, f, multipanel, kwargs)
+                    for f, obj in todo.items()
+                }
+                out = {f: fut.result() for f, fut in futures.items()}
+            for f in todo:
+                self.hashes[f] = hashes[f]
+        self._save_cache()
+        return {f: out.get(f) for f in objs}
+
+
+# one exporter (browser session) per worker process
+_worker_exporter = None
+
+def _init_worker():
+    # pool workers leave through os._exit, which skips atexit handlers but
+    # not multiprocessing's own finalizers
+    from multiprocessing.util import Finalize
+    global _worker_exporter
+    _worker_exporter = SVGExporter()
+    Finalize(_worker_exporter, _worker_exporter.close, exitpriority=10)
 
-    for panel in panels:
-        os.remove(panel)
+def _export_in_worker(obj, fname, multipanel, kwargs):
+    return _worker_exporter.save(obj, fname, multipanel=multipanel, **kwargs)
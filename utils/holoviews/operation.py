@@ -1,9 +1,73 @@
+from collections import OrderedDict
+import hashlib
+
 import holoviews as hv
 from holoviews.core.util import isdatetime
 import numpy as np
 import pandas as pd
 import param
-from scipy.stats import linregress
+from scipy.stats import t as student_t
+
+def binned_stats(bin_idx, y, nbins, quantiles=(), weights=None, avg_fun=None):
+    """
+    Mean and quantiles of y for all bins at once.
+
+    Parameters
+    ----------
+    bin_idx : int array, bin of each y (values outside 0..nbins-1 are ignored)
+    y : array
+    nbins : int
+    quantiles : iterable of floats in [0, 1]
+    weights : array, optional, weights for the mean
+    avg_fun : callable, optional, used per bin instead of the (weighted) mean
+
+    Returns
+    -------
+    mean : array of shape (nbins,)
+    quants : array of shape (len(quantiles), nbins)
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    valid = (bin_idx >= 0) & (bin_idx < nbins) & ~np.isnan(y)
+    if weights is not None:
+        valid &= ~np.isnan(weights)
+        weights = weights[valid]
+    b, y = bin_idx[valid], y[valid]
+
+    counts = np.bincount(b, minlength=nbins)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    # sort by value, then (stable, small ints => radix sort) by bin
+    order = np.argsort(y)
+    b_small = b.astype(np.min_scalar_type(nbins))
+    order = order[np.argsort(b_small[order], kind='stable')]
+    y_sorted = y[order]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if avg_fun is not None:
+            mean = np.array([
+                avg_fun(ys) if len(ys) else np.nan
+                for ys in np.split(y_sorted, starts[1:])
+            ])
+        elif weights is not None:
+            mean = np.bincount(b, weights=weights*y, minlength=nbins)/np.bincount(b, weights=weights, minlength=nbins)
+        else:
+            mean = np.bincount(b, weights=y, minlength=nbins)/counts
+
+    # linear interpolation between order statistics, like np.nanquantile
+    quants = np.full((len(quantiles), nbins), np.nan)
+    nonempty = counts > 0
+    n, start = counts[nonempty], starts[nonempty]
+    for k, q in enumerate(quantiles):
+        pos = q*(n - 1)
+        lo = np.floor(pos).astype(int)
+        hi = np.minimum(lo + 1, n - 1)
+        ylo, yhi = y_sorted[start + lo], y_sorted[start + hi]
+        quants[k, nonempty] = ylo + (pos - lo)*(yhi - ylo)
+    return mean, quants
 
 class bin_average(hv.Operation):
     """
@@ -11,61 +75,247 @@ class bin_average(hv.Operation):
 
     Parameters
     ----------
-    bins: Iterable
+    bins: Iterable of bin edges, or int for that many equal-width bins
+    quantiles: (lower, upper) quantiles shown as error bars
+    weights: name of a dimension with weights for the mean
 
     License
     -------
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    bins = param.Integer(default=10,
-        # objects=[int, list],
-        allow_None=True,
-        doc='Bin edges.')
+    bins = param.ClassSelector(default=10,
+        class_=(int, list, tuple, np.ndarray, pd.Index),
+        doc='Bin edges, or number of bins.')
 
     avg_fun = param.Callable(
         default=np.nanmean, doc='Averaging function'
     )
 
+    quantiles = param.NumericTuple(default=(0.16, 0.84), length=2,
+        doc='Lower and upper quantile.')
+
+    weights = param.String(default=None, allow_None=True,
+        doc='Dimension holding weights for the mean.')
+
     def _process(self, element, key=None):
         x, y = (element.dimension_values(i) for i in range(2))
         x_dim, y_dim = (element.dimensions()[i] for i in range(2))
+        y = y.astype(float)
+
+        is_dt = isdatetime(x)
+        if is_dt:
+            x = x.astype('datetime64[ns]')
+            x_num = x.astype('i8').astype(float)
+            x_num[np.isnat(x)] = np.nan
+        else:
+            x_num = x.astype(float)
 
         bins = self.p.bins
-        bins = np.array(bins)
-        # if bins is None:
-        #     bins = 10
-        # if isinstance(bins, int):
-        #     print(isdatetime(x))
-        #     if isdatetime(x):
-        #         bins = pd.date_range(x.min(), x.max(), periods=bins)
-        #     else:
-        #         bins = np.linspace(x.min(), x.max(), bins)
-        # elif isinstance(bins, list):
-        #     bins = np.array(bins)
-
-        x_avg = bins[:-1] + np.diff(bins)/2
-        y_avg, y16, y84 = (np.nan*np.zeros(len(x_avg)) for i in range(3))
-        for k, ll, ul in zip(range(len(x_avg)), bins[:-1], bins[1:]):
-            y_sel = y[(ll<x) & (x<=ul)]
-            y_avg[k] = self.p.avg_fun(y_sel)
-            y16[k] = np.nanquantile(y_sel, q=0.16)
-            y84[k] = np.nanquantile(y_sel, q=0.84)
-        errors = {x_dim.name: x_avg, y_dim.name: np.array(y_avg),
-                  'y16': np.array(y_avg)-np.array(y16),
-                  'y84': np.array(y84)-np.array(y_avg)}
-        return hv.ErrorBars(errors, kdims=[x_dim], vdims=[y_dim, 'y16', 'y84'])
+        if isinstance(bins, int):
+            edges = np.linspace(np.nanmin(x_num), np.nanmax(x_num), bins+1)
+        elif is_dt:
+            edges = np.array(bins, dtype='datetime64[ns]').astype('i8').astype(float)
+        else:
+            edges = np.array(bins, dtype=float)
+
+        bin_idx = np.digitize(x_num, edges, right=True) - 1
+        if isinstance(bins, int):
+            # include lowest value
+            bin_idx[x_num == edges[0]] = 0
+
+        weights = None
+        if self.p.weights is not None:
+            weights = element.dimension_values(self.p.weights).astype(float)
+
+        avg_fun = self.p.avg_fun
+        if avg_fun in (np.nanmean, np.mean):
+            avg_fun = None
+        y_avg, (ylo, yhi) = binned_stats(
+            bin_idx, y, len(edges)-1, quantiles=self.p.quantiles,
+            weights=weights, avg_fun=avg_fun,
+        )
+
+        x_avg = edges[:-1] + np.diff(edges)/2
+        if is_dt:
+            x_avg = x_avg.astype('i8').astype('datetime64[ns]')
+        lo_name, hi_name = (f'y{100*q:g}' for q in self.p.quantiles)
+        errors = {x_dim.name: x_avg, y_dim.name: y_avg,
+                  lo_name: y_avg - ylo,
+                  hi_name: yhi - y_avg}
+        return hv.ErrorBars(errors, kdims=[x_dim], vdims=[y_dim, lo_name, hi_name])
+
+# results of the operations below are memoized on a hash of the data
+_cache_size = 256
+
+def _data_key(x, y, *settings):
+    h = hashlib.sha1(repr(settings).encode())
+    for a in (x, y):
+        a = np.ascontiguousarray(a)
+        h.update(str(a.dtype).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+def _cache_store(cache, key, value, size=_cache_size):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > size:
+        cache.popitem(last=False)
+
+def _numeric_xy(element):
+    x, y = (element.dimension_values(i) for i in range(2))
+    x = x.astype('datetime64[ns]').astype('i8') if isdatetime(x) else x
+    y = y.astype('datetime64[ns]').astype('i8') if isdatetime(y) else y
+    return x, y
 
 try:
     from statsmodels.nonparametric.smoothers_lowess import lowess as sm_lowess
 except:
     sm_lowess = None
 
+def _tricube(d, h):
+    return np.clip(1 - (np.abs(d)/h)**3, 0, 1)**3
+
+def _wls_at_zero(s0, s1, s2, t0, t1):
+    # intercept of the weighted linear fit in coordinates centered on x0
+    det = s0*s2 - s1**2
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(np.abs(det) > 1e-12*s0*s2, (s2*t0 - s1*t1)/det, t0/s0)
+
+def _local_linear_fit(x, y, rw, x0, h, start, k, block_size=2**20):
+    """
+    Tricube-weighted local linear fits at x0 with bandwidths h, each using
+    the window x[start:start+k] of the sorted data, evaluated in blocks of
+    about block_size (window) points.
+    """
+    out = np.empty(len(x0))
+    offsets = np.arange(k)
+    step = max(1, block_size // k)
+    for i in range(0, len(x0), step):
+        sl = slice(i, i+step)
+        idx = start[sl, None] + offsets
+        dx = x[idx] - x0[sl, None]
+        w = _tricube(dx, h[sl, None]) * rw[idx]
+        yw = y[idx]
+        out[sl] = _wls_at_zero(
+            w.sum(1), (w*dx).sum(1), (w*dx**2).sum(1),
+            (w*yw).sum(1), (w*dx*yw).sum(1),
+        )
+    return out
+
+def _binned_local_linear_fit(x, y, rw, x0, h, n_bins):
+    """
+    As _local_linear_fit, but from weighted moments of x and y in n_bins
+    equal-width bins, with the tricube weight taken at each bin's mean x.
+    O(n + len(x0)*n_bins) instead of O(len(x0)*k).
+    """
+    edges = np.linspace(x[0], x[-1], n_bins+1)
+    b = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_bins-1)
+    c = (edges[:-1] + edges[1:])/2
+    u = x - c[b]  # moments relative to bin centers, for numerical stability
+    W, Wu, Wuu, Wy, Wuy = (
+        np.bincount(b, weights=rw*v, minlength=n_bins)
+        for v in (1, u, u**2, y, u*y)
+    )
+    keep = W > 0
+    W, Wu, Wuu, Wy, Wuy, c = (a[keep] for a in (W, Wu, Wuu, Wy, Wuy, c))
+    D = c[None, :] - x0[:, None]
+    t = _tricube(D + Wu/W, h[:, None])
+    return _wls_at_zero(
+        t @ W, (t*D) @ W + t @ Wu, (t*D**2) @ W + 2*(t*D) @ Wu + t @ Wuu,
+        t @ Wy, (t*D) @ Wy + t @ Wuy,
+    )
+
+def lowess_grid(x, y, frac=2/3, it=3, n_eval=200, n_bins=1000, block_size=2**20):
+    """
+    LOWESS smoothing evaluated on a fixed grid.
+
+    The data are sorted once; the k = frac*n nearest neighbours of each
+    grid point then form a contiguous window located by one searchsorted,
+    and all local regressions are computed in vectorized blocks. For more
+    than n_bins data points, the regressions are computed from moments of
+    the data binned in x, so that each robustifying iteration is O(n).
+
+    Parameters
+    ----------
+    x, y : array
+    frac : float, fraction of the data used for each local regression
+    it : int, number of robustifying iterations
+    n_eval : int, number of grid points; if there are no more data points
+        than this, the fit is evaluated at the (sorted) data instead.
+    n_bins : int or None, number of bins for large data (None to never bin)
+
+    Returns
+    -------
+    x_eval, y_eval : arrays, sorted
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    order = np.argsort(x, kind='stable')
+    x, y = x[order], y[order]
+    n = len(x)
+    if n == 0:
+        return x, y
+
+    k = min(n, max(3, int(np.ceil(frac*n))))
+    x_eval = np.linspace(x[0], x[-1], n_eval) if n > n_eval else x
+    # window start s minimizing the bandwidth: first s with x[s]+x[s+k] >= 2*x0
+    start = np.searchsorted(x[:n-k] + x[k:], 2*x_eval, side='left')
+    h = np.maximum(x_eval - x[start], x[start+k-1] - x_eval)
+    h[h == 0] = 1
+    binned = n_bins is not None and n > n_bins
+
+    rw = np.ones(n)
+    for i in range(it + 1):
+        if binned:
+            y_eval = _binned_local_linear_fit(x, y, rw, x_eval, h, n_bins)
+        else:
+            y_eval = _local_linear_fit(x, y, rw, x_eval, h, start, k, block_size)
+        if i == it:
+            break
+        resid = y - (y_eval if x_eval is x else np.interp(x, x_eval, y_eval))
+        s = np.median(np.abs(resid))
+        if s == 0:
+            break
+        rw = np.clip(1 - (resid/(6*s))**2, 0, 1)**2
+    return x_eval, y_eval
+
+# memoized smooths, keyed on a hash of the data and settings
+_lowess_cache = OrderedDict()
+
+_grid_kwargs = ['frac', 'it', 'n_eval', 'n_bins', 'block_size']
+
+def _lowess_xy(x, y, engine, kwargs):
+    if engine == 'grid':
+        unknown = set(kwargs) - set(_grid_kwargs)
+        if unknown:
+            raise TypeError(
+                f"lowess engine 'grid' does not accept {sorted(unknown)}, "
+                f"only {_grid_kwargs}"
+            )
+        return lowess_grid(x, y, **kwargs)
+
+    if sm_lowess is None:
+        raise ImportError('Needs statsmodels library.')
+    # force return_sorted because this changes the output.
+    kwargs = dict(kwargs, **{'return_sorted': True})
+    delta_fraction = kwargs.pop('delta_fraction', 0.01)
+    kwargs['delta'] = kwargs.get('delta', delta_fraction*np.ptp(x))
+    x_smooth, y_smooth = sm_lowess(y, x, **kwargs).T
+    return x_smooth, y_smooth
+
 class lowess(hv.Operation):
     """
     Performs LOWESS smoothing.
 
-    Can pass following kwargs on to statsmodels.nonparametric.smoothers_lowess.lowess:
+    The default 'statsmodels' engine passes kwargs on to
+    statsmodels.nonparametric.smoothers_lowess.lowess:
     dict(
         frac=0.6666666666666666,
         it=3,
@@ -74,6 +324,18 @@ class lowess(hv.Operation):
         missing='drop',
         return_sorted=True,
     )
+    and additionally accepts delta_fraction (default 0.01), used for delta
+    as a fraction of the x range if delta is not given.
+
+    The 'grid' engine (see lowess_grid) is much faster for large data and
+    evaluates the smooth on a grid of n_eval points instead of at the data
+    x (for up to n_eval points, at the data x). It only takes the kwargs
+    dict(frac=2/3, it=3, n_eval=200, n_bins=1000) and raises on others.
+
+    Results are cached on a hash of the element's data and the settings,
+    so re-rendering unchanged elements does not recompute the smooth.
+    With processes, the elements of a container (HoloMap, NdOverlay,
+    Layout, ...) are smoothed in a process pool.
 
     Reference:
         https://www.statsmodels.org/dev/generated/statsmodels.nonparametric.smoothers_lowess.lowess.html
@@ -83,60 +345,188 @@ class lowess(hv.Operation):
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    kwargs = param.Dict(default=None, doc='''kwargs to pass on to smoother.
-        return_sorted=True is always forced.''')
+    kwargs = param.Dict(default=None, doc='''kwargs to pass on to smoother,
+        see above. For statsmodels, return_sorted=True is always forced.''')
 
-    def _process(self, element, key=None):
-        if sm_lowess is None:
-            raise ImportError('Needs statsmodels library.')
+    engine = param.ObjectSelector(default='statsmodels', objects=['statsmodels', 'grid'],
+        doc='Smoother implementation.')
+
+    processes = param.Integer(default=None, allow_None=True,
+        doc='''Smooth the elements of a container in a pool of this many
+        processes (0 for one per CPU).''')
 
+    # smooth the elements of overlays one by one, not the overlay as a whole
+    _per_element = True
+
+    def __call__(self, element, **kwargs):
+        p = param.ParamOverrides(self, kwargs, allow_extra_keywords=True)
+        if p.processes is not None and p.processes != 1 and not isinstance(element, hv.Element):
+            from concurrent.futures import ProcessPoolExecutor
+            opts = {} if p.kwargs is None else p.kwargs
+            todo = {}
+            for el in element.traverse(lambda el: el, [hv.Element]):
+                x, y = _numeric_xy(el)
+                key = _data_key(x, y, p.engine, sorted(opts.items()))
+                if key not in _lowess_cache:
+                    todo[key] = (x, y)
+            if len(todo) > 1:
+                with ProcessPoolExecutor(max_workers=p.processes or None) as executor:
+                    futures = {
+                        key: executor.submit(_lowess_xy, x, y, p.engine, opts)
+                        for key, (x, y) in todo.items()
+                    }
+                    for key, fut in futures.items():
+                        _cache_store(_lowess_cache, key, fut.result())
+        return super().__call__(element, **kwargs)
+
+    def _process(self, element, key=None):
         kwargs = {} if self.p.kwargs is None else self.p.kwargs
-        # force return_sorted because this changes the output.
-        kwargs = dict(kwargs, **{'return_sorted': True})
+        x_dtype = element.dimension_values(0).dtype
+        x, y = _numeric_xy(element)
 
-        x, y = (element.dimension_values(i) for i in range(2))
-        x_dtype, y_dtype = x.dtype, y.dtype
-        x = x.astype(int) if isdatetime(x) else x
-        y = y.astype(int) if isdatetime(y) else y
-
-        delta_fraction = kwargs.pop('delta_fraction', 0.01)
-        kwargs['delta'] = kwargs.get('delta', delta_fraction*np.ptp(x))
-        # kwargs['frac'] = kwargs.get('frac', .2)
-        x_smooth, y_smooth = np.split(sm_lowess(y, x, **kwargs), 2, axis=1)
-        x_smooth = np.array(x_smooth, dtype=x_dtype)
-        y = np.array(y, dtype=y_dtype)
+        h = _data_key(x, y, self.p.engine, sorted(kwargs.items()))
+        if h not in _lowess_cache:
+            _cache_store(_lowess_cache, h, _lowess_xy(x, y, self.p.engine, kwargs))
+        x_smooth, y_smooth = _lowess_cache[h]
+
+        if x_dtype.kind == 'M':
+            x_smooth = np.round(x_smooth).astype('i8').astype('datetime64[ns]')
+        elif x_dtype.kind == 'f' or np.all(x_smooth == np.round(x_smooth)):
+            x_smooth = np.array(x_smooth, dtype=x_dtype)
+        # else (integer x, non-integer grid): keep float x
         return element.clone(data=(x_smooth, y_smooth), new_type=hv.Curve)
 
 
+def fit_lines(xs, ys):
+    """
+    Ordinary least-squares lines through many groups of points at once,
+    from per-group sums of the concatenated data.
+
+    Parameters
+    ----------
+    xs, ys : sequences of 1d arrays, one pair per group
+
+    Returns
+    -------
+    pd.DataFrame with one row per group and columns slope, intercept,
+    rvalue, pvalue, stderr (as scipy.stats.linregress), n, xmin, xmax.
+    NaN-pairs are ignored.
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    ngroups = len(xs)
+    g = np.repeat(np.arange(ngroups), [len(x) for x in xs])
+    x = np.concatenate([np.asarray(x, dtype=float) for x in xs]) if ngroups else np.array([])
+    y = np.concatenate([np.asarray(y, dtype=float) for y in ys]) if ngroups else np.array([])
+    valid = ~(np.isnan(x) | np.isnan(y))
+    g, x, y = g[valid], x[valid], y[valid]
+
+    def gsum(v):
+        return np.bincount(g, weights=v, minlength=ngroups)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        n = np.bincount(g, minlength=ngroups)
+        xm, ym = gsum(x)/n, gsum(y)/n
+        # center per group for numerical stability
+        dx, dy = x - xm[g], y - ym[g]
+        sxx, syy, sxy = gsum(dx*dx), gsum(dy*dy), gsum(dx*dy)
+        slope = sxy/sxx
+        intercept = ym - slope*xm
+        r = np.clip(sxy/np.sqrt(sxx*syy), -1, 1)
+        dof = n - 2
+        stderr = np.sqrt((1 - r**2)*syy/sxx/dof)
+        t = r*np.sqrt(dof/((1 - r)*(1 + r)))
+        pvalue = 2*student_t.sf(np.abs(t), dof)
+    # two points: exact fit, conventions as in linregress
+    two = n == 2
+    stderr = np.where(two, 0., np.where(dof > 0, stderr, np.nan))
+    pvalue = np.where(two, np.where(syy == 0, 1., 0.), np.where(dof > 0, pvalue, np.nan))
+
+    xmin, xmax = np.full(ngroups, np.nan), np.full(ngroups, np.nan)
+    np.fmin.at(xmin, g, x)
+    np.fmax.at(xmax, g, x)
+    return pd.DataFrame(dict(
+        slope=slope, intercept=intercept, rvalue=r, pvalue=pvalue,
+        stderr=stderr, n=n, xmin=xmin, xmax=xmax,
+    ))
+
+# memoized fit statistics, keyed on a hash of the data (small, so keep many)
+_regression_cache = OrderedDict()
+_regression_cache_size = 2**14
+
+def _fit_elements(elements):
+    """
+    Fit statistics (dicts) of all elements, fitting the ones not yet in the
+    cache in a single batched pass.
+    """
+    keys, fits, todo = [], {}, {}
+    for el in elements:
+        x, y = _numeric_xy(el)
+        key = _data_key(x, y, 'ols')
+        keys.append(key)
+        if key in _regression_cache:
+            fits[key] = _regression_cache[key]
+        else:
+            todo[key] = (x, y)
+    if todo:
+        new = fit_lines(*zip(*todo.values())).to_dict('records')
+        for key, fit in zip(todo, new):
+            fits[key] = fit
+            _cache_store(_regression_cache, key, fit, _regression_cache_size)
+    return [fits[key] for key in keys]
+
+def regression_stats(obj):
+    """
+    Fit statistics of the regression lines through all elements of obj
+    (see fit_lines), one row per element in traversal order.
+    """
+    elements = obj.traverse(lambda el: el, [hv.Element])
+    stats = pd.DataFrame(_fit_elements(elements))
+    stats.insert(0, 'group', [el.group for el in elements])
+    stats.insert(1, 'label', [el.label for el in elements])
+    return stats
+
 class regression(hv.Operation):
     """
     Perform linear regression on element.
 
+    The fitted line is returned as a Curve through its two endpoints (at
+    the smallest and largest x). The fit statistics (slope, intercept,
+    rvalue, pvalue, stderr, n; see fit_lines) are attached to it as
+    constant dimensions, e.g. curve.cdims, which survive cloning and
+    restyling; regression_stats collects them for a whole object.
+
+    All elements of a container (HoloMap, NdOverlay, gridmatrix, ...) are
+    fitted in one vectorized pass, and fits are cached on a hash of the
+    data, so restyling and re-rendering does not refit.
+
     License
     -------
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
+    # fit the elements of overlays one by one, not the overlay as a whole
+    _per_element = True
+
+    def __call__(self, element, **kwargs):
+        if not isinstance(element, hv.Element):
+            # prefill the cache in one batch
+            _fit_elements(element.traverse(lambda el: el, [hv.Element]))
+        return super().__call__(element, **kwargs)
+
     def _process(self, element, key=None):
-        xp, yp = (element.dimension_values(i) for i in range(2))
-        if len(xp):
-            if isdatetime(xp[0]):
-                xp = xp.astype(int)
-                is_dt = True
-            else:
-                is_dt = False
-            inan = np.isnan(xp) | np.isnan(yp)
-            xp, yp = xp[~inan], yp[~inan]
-            if len(xp):
-                slope, intercept, r, p_value, _ = linregress(xp, yp)
-                y = slope*xp + intercept
-                # p = np.polyfit(x=xp, y=yp, deg=1)
-                # y = p[0]*xp + p[1]
-                if is_dt:
-                    xp = xp.astype(np.datetime64)
-            else:
-                slope = np.nan
-                y = np.nan*xp
+        fit, = _fit_elements([element])
+        xp = np.array([fit['xmin'], fit['xmax']])
+        y = fit['slope']*xp + fit['intercept']
+        if element.dimension_values(0).dtype.kind == 'M':
+            xp = np.where(np.isnan(xp), np.iinfo('i8').min, xp)
+            xp = xp.astype('i8').astype('datetime64[ns]')
+        if not fit['n']:
+            xp, y = xp[:0], y[:0]
+        stats = {k: v for k, v in fit.items() if k not in ['xmin', 'xmax']}
         return element.clone(
-            (xp, y, [slope]*len(xp)),
-            vdims=element.vdims+['Slope'], new_type=hv.Curve)
+            (xp, y), vdims=element.vdims[:1], new_type=hv.Curve,
+            cdims=dict(element.cdims, **stats))
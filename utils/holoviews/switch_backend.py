@@ -1,4 +1,4 @@
-from copy import deepcopy
+from copy import copy
 from collections import OrderedDict
 import numpy as np
 from holoviews import Options, dim, Cycle
@@ -36,8 +36,7 @@ def translate_recursively(x, translator):
         return Cycle([translate_recursively(v, translator)
                       for v in x.values])
     elif isinstance(x, dim):
-        xx = deepcopy(x)
-        kw = xx.ops[0]['kwargs']
+        kw = x.ops[0]['kwargs']
         kw_new = {
             k: {
                 kk: translate_recursively(vv, translator)
@@ -46,13 +45,16 @@ def translate_recursively(x, translator):
             else translate_recursively(v, translator)
             for k, v in kw.items()
         }
-        xx.ops[0]['kwargs'] = kw_new
+        # shallow copy with new ops, leave untouched parts shared with x
+        xx = copy(x)
+        xx.ops = [dict(x.ops[0], kwargs=kw_new)] + list(x.ops[1:])
         return xx
 
 # each value of this dict has keys for the bokeh option and the corresponding
 # mpl option as value. (None means option will be discarded.)
 # Tuples have the mpl option name as first entry and the corresponding value as
-# second entry
+# second entry.
+# Call clear_translation_tables() after modifying it in place.
 bokeh2mpl = {
     # 'force' is an exception: it has the option as key but the new value of the
     # option in the mpl backend is the corresponding dict value
@@ -126,6 +128,9 @@ bokeh2mpl = {
     },
 }
 
+# translation dictionaries cached by lookup_translation
+_builtin_translations = (bokeh2mpl,)
+
 def set_new_value(new_value_or_fn, old_value):
     """
     Either replace the old value or transform it using the function.
@@ -149,6 +154,34 @@ def extract_if_key_is_substr(d, key):
                 for kv in v.items()
                 )
 
+# flattened built-in translation tables, {id(d): {key: extract_if_key_is_substr(d, key)}}
+_translation_tables = {}
+
+def lookup_translation(d, key):
+    """
+    Cached version of extract_if_key_is_substr for the built-in translation
+    dictionaries (such as bokeh2mpl): their comma-separated keys are split
+    once, and the merged entries for each key are kept. After modifying a
+    built-in dictionary, call clear_translation_tables().
+    Other dictionaries (such as overrides) are not cached.
+    """
+    if key == 'all' or not any(d is b for b in _builtin_translations):
+        return extract_if_key_is_substr(d, key)
+    index = _translation_tables.get(id(d))
+    if index is None:
+        index = {}
+        for k, v in d.items():
+            for name in set(k.split(',')):
+                index.setdefault(name, {}).update(v)
+        _translation_tables[id(d)] = index
+    return index.get(key, {})
+
+def clear_translation_tables():
+    """
+    Invalidate the cached translation tables, e.g. after extending bokeh2mpl.
+    """
+    _translation_tables.clear()
+
 def parse_translation(lookup, k, v):
     """
     Given a lookup dictionary, translate a key-value pair.
@@ -239,13 +272,13 @@ def translate_options(options, dictionaries=None, override={}):
         # translation for a given kwarg is available
         lookup = {
             **dictionaries['all'],
-            **extract_if_key_is_substr(dictionaries, name),
-            **extract_if_key_is_substr(dictionaries, name_full)
+            **lookup_translation(dictionaries, name),
+            **lookup_translation(dictionaries, name_full)
         }
         # 3 -- complete element-specific override variables
         force3 = {
-            **extract_if_key_is_substr(override, name),
-            **extract_if_key_is_substr(override, name_full),
+            **lookup_translation(override, name),
+            **lookup_translation(override, name_full),
         }
 
         kwargs_new = update_element(
@@ -262,3 +295,70 @@ def translate_options(options, dictionaries=None, override={}):
 def add_backend_to_opts(opts, backend):
     for k, o in enumerate(opts):
         opts[k] = Options(o.key, **{**o.kwargs, **{'backend': backend}})
+
+
+def _allowed_options(o, backend):
+    from holoviews import Store
+    node = Store.options(backend=backend)[type(o).__name__]
+    return {
+        k for g in ['plot', 'style', 'norm']
+        for k in node.groups[g].allowed_keywords
+    }
+
+def translate_layout(obj, dictionaries=None, override={},
+                     from_backend='bokeh', to_backend=None):
+    """
+    Translate the options of all objects in a holoviews object in one go.
+
+    Only explicitly set (non-default) options are translated, and objects
+    sharing the same options are translated only once.
+
+    Parameters
+    ----------
+    obj : holoviews object
+    dictionaries, override : see translate_options
+    from_backend : str
+    to_backend : str, default is the 'backend' forced by dictionaries,
+        or 'matplotlib'
+
+    Returns
+    -------
+    clone of obj with translated options
+    """
+    from holoviews import Store
+    if dictionaries is None:
+        dictionaries = bokeh2mpl
+    if to_backend is None:
+        to_backend = dictionaries.get('force', {}).get('backend', 'matplotlib')
+
+    translated = {}
+
+    def translate(o):
+        if o.id is None:
+            return o
+        if o.id not in translated:
+            kwargs = {}
+            for group in ['plot', 'style']:
+                kwargs.update(Store.lookup_options(
+                    from_backend, o, group, defaults=False).kwargs)
+            if not kwargs:
+                translated[o.id] = None
+            else:
+                key = '.'.join(
+                    [type(o).__name__]
+                    + [s for s in (o.group, o.label) if s and s != type(o).__name__]
+                )
+                [o_new] = translate_options(
+                    [Options(key, **kwargs)], dictionaries, override)
+                # drop what the target backend does not know for this type,
+                # such as forced element options (hooks, ...) on a Layout
+                allowed = _allowed_options(o, to_backend)
+                translated[o.id] = {
+                    k: v for k, v in o_new.kwargs.items() if k in allowed
+                }
+        kwargs_new = translated[o.id]
+        if kwargs_new is None:
+            return o
+        return o.opts(backend=to_backend, clone=True, **kwargs_new)
+
+    return obj.map(translate, specs=lambda x: True)
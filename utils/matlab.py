@@ -1,10 +1,95 @@
 import datetime as dt
+from functools import partial
 import numpy as np
 
 def matlab2datetime(matlab_datenum):
     if np.isnan(matlab_datenum):
-        return np.NaN
+        return np.nan
     else:
         day = dt.datetime.fromordinal(int(matlab_datenum))
         dayfrac = dt.timedelta(days=matlab_datenum%1) - dt.timedelta(days = 366)
         return day + dayfrac
+
+# matlab datenum of 1970-01-01
+_DATENUM_UNIX_EPOCH = 719529
+
+def _apply_elementwise(func, x, dtype):
+    """
+    Apply an ndarray -> ndarray function to numpy, pandas or xarray (also
+    dask-backed) input, returning the same container type.
+    """
+    import pandas as pd
+    if isinstance(x, pd.DataFrame):
+        return x.apply(lambda s: _apply_elementwise(func, s, dtype))
+    elif isinstance(x, pd.Series):
+        return pd.Series(func(x.to_numpy()), index=x.index, name=x.name)
+    elif isinstance(x, pd.Index):
+        return pd.Index(func(x.to_numpy()), name=x.name)
+    elif hasattr(x, 'dims') and hasattr(x, 'data'):
+        import xarray as xr
+        return xr.apply_ufunc(func, x, dask='parallelized', output_dtypes=[dtype])
+    return func(np.asarray(x))[()]
+
+# datenums representable as datetime64[ns] (about 1677-09-22 to 2262-04-11),
+# with one second of margin against rounding
+_DATENUM_MIN = _DATENUM_UNIX_EPOCH + (np.iinfo('i8').min + 10**9)/86400e9
+_DATENUM_MAX = _DATENUM_UNIX_EPOCH + (np.iinfo('i8').max - 10**9)/86400e9
+
+def _datenum_to_datetime64(d, errors='raise'):
+    d = np.asarray(d, dtype=float)
+    isnan = np.isnan(d)
+    out_of_range = ~isnan & ~((d >= _DATENUM_MIN) & (d <= _DATENUM_MAX))
+    if out_of_range.any():
+        if errors == 'raise':
+            raise ValueError(
+                f'{out_of_range.sum()} datenum(s) outside the datetime64[ns] range '
+                f'({_DATENUM_MIN:.0f} to {_DATENUM_MAX:.0f}), e.g. '
+                f'{d[out_of_range].flat[0]}. Use errors="coerce" to get NaT.'
+            )
+        isnan = isnan | out_of_range
+    d = np.where(isnan, _DATENUM_UNIX_EPOCH, d)
+    # split whole days and fractions to avoid adding rounding error
+    days = np.floor(d)
+    ns = (
+        (days - _DATENUM_UNIX_EPOCH).astype('i8')*86400*10**9
+        + np.round((d - days)*86400e9).astype('i8')
+    )
+    return np.where(isnan, np.datetime64('NaT', 'ns'), ns.astype('datetime64[ns]'))
+
+def _datetime64_to_datenum(t):
+    t = np.asarray(t, dtype='datetime64[ns]')
+    ns = (t - np.datetime64('1970-01-01', 'ns')).astype('i8')
+    days, frac = np.divmod(ns, 86400*10**9)
+    d = (days + _DATENUM_UNIX_EPOCH) + frac/86400e9
+    return np.where(np.isnat(t), np.nan, d)
+
+def matlab2datetime64(matlab_datenum, errors='raise'):
+    """
+    Vectorized conversion of matlab datenums to datetime64[ns].
+
+    Accepts scalars, numpy arrays, pandas Series/DataFrames and xarray
+    DataArrays (dask-backed ones stay lazy). NaN becomes NaT.
+
+    Datenums outside the datetime64[ns] range (about years 1677 to 2262,
+    e.g. fill values like 0) raise a ValueError, or become NaT with
+    errors='coerce'.
+
+    Precision is limited by the float64 datenum itself: for present-day
+    dates its resolution is about 10 µs, so results (and round trips through
+    datetime2matlab) are accurate to a few µs, not to the nanosecond.
+    """
+    if errors not in ['raise', 'coerce']:
+        raise ValueError(f"errors must be 'raise' or 'coerce', not {errors!r}")
+    return _apply_elementwise(
+        partial(_datenum_to_datetime64, errors=errors), matlab_datenum, 'datetime64[ns]'
+    )
+
+def datetime2matlab(times):
+    """
+    Inverse of matlab2datetime64: convert datetimes to matlab datenums.
+    NaT becomes NaN.
+
+    float64 datenums resolve present-day dates to about 10 µs, so
+    sub-µs parts of the times are lost (see matlab2datetime64).
+    """
+    return _apply_elementwise(_datetime64_to_datenum, times, float)
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 import cartopy.crs as ccrs
 import matplotlib.ticker as mticker
 from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
@@ -37,6 +39,75 @@ def align_xaxis_extents(anchor_ax, ax):
     ax.set_position(Bbox.from_bounds(x0, y0, w, h))
 
 
+def _interp_rows(x0, X, Y):
+    """
+    np.interp(x0, X[i], Y[i]) for every row i at once (rows of X increasing).
+    """
+    m = X.shape[1]
+    j = np.clip((X <= x0[:, None]).sum(axis=1) - 1, 0, m - 2)
+    rows = np.arange(len(X))
+    xa, xb, ya, yb = X[rows, j], X[rows, j + 1], Y[rows, j], Y[rows, j + 1]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        y0 = ya + (x0 - xa) / (xb - xa) * (yb - ya)
+    y0 = np.where(x0 <= X[:, 0], Y[:, 0], y0)
+    return np.where(x0 >= X[:, -1], Y[:, -1], y0)
+
+
+@lru_cache(maxsize=256)
+def _grid_label_layout(
+    proj, extent, xlim, ylim, lons, lats, label_lons, label_lats,
+    label_offset, label_along_fixed,
+):
+    """
+    Positions and visibility of all graticule labels, from one projection
+    of all anchor points. Arguments must be hashable (tuples).
+
+    Returns
+    -------
+    lat_xy, lat_visible, lon_xy, lon_visible
+    """
+    label_lats, label_lons = np.array(label_lats, float), np.array(label_lons, float)
+    nlat, nlon = len(label_lats), len(label_lons)
+    if label_along_fixed is None:
+        # latitude circles and meridians, sampled every degree
+        some_lons = np.arange(min(lons), max(lons), 1)
+        some_lats = np.arange(min(lats), max(lats), 1)
+        lon_pts = np.concatenate([
+            np.broadcast_to(some_lons, (nlat, len(some_lons))).ravel(),
+            np.repeat(label_lons, len(some_lats)),
+        ])
+        lat_pts = np.concatenate([
+            np.repeat(label_lats, len(some_lons)),
+            np.broadcast_to(some_lats, (nlon, len(some_lats))).ravel(),
+        ])
+    else:
+        lon_pts = np.concatenate([np.full(nlat, label_along_fixed[0]), label_lons])
+        lat_pts = np.concatenate([label_lats, np.full(nlon, label_along_fixed[1])])
+
+    xy = proj.transform_points(ccrs.PlateCarree(), lon_pts, lat_pts)[:, :2]
+
+    if label_along_fixed is None:
+        lat_part, lon_part = np.split(xy, [nlat * len(some_lons)])
+        lat_part = lat_part.reshape(nlat, len(some_lons), 2)
+        lon_part = lon_part.reshape(nlon, len(some_lats), 2)
+        # interpolate latitude circles to the left map boundary, meridians
+        # to the bottom one
+        lat_x = np.full(nlat, xlim[0])
+        lat_y = _interp_rows(lat_x, lat_part[..., 0], lat_part[..., 1])
+        lon_y = np.full(nlon, ylim[0])
+        lon_x = _interp_rows(lon_y, lon_part[..., 1], lon_part[..., 0])
+    else:
+        (lat_x, lat_y), (lon_x, lon_y) = (a.T for a in np.split(xy, [nlat]))
+
+    lat_visible = (extent[2] < lat_y) & (lat_y < extent[3])
+    lon_visible = (extent[0] < lon_x) & (lon_x < extent[1])
+    lat_xy = np.column_stack([lat_x - label_offset, lat_y])
+    lon_xy = np.column_stack([lon_x, lon_y - label_offset])
+    for a in (lat_xy, lat_visible, lon_xy, lon_visible):
+        a.flags.writeable = False
+    return lat_xy, lat_visible, lon_xy, lon_visible
+
+
 def set_cartopy_grid(
     ax,
     lons,
@@ -56,6 +127,9 @@ def set_cartopy_grid(
     arranged somewhat rectangularly. For circumpolar maps, see circumpolar_axis
     further below.
 
+    Label positions are computed for all labels at once and cached per
+    (projection, extent, lons, lats, ...), so axes sharing these are cheap.
+
     Parameters
     ----------
     label_lons, label_lats: If not None, label only these.
@@ -91,54 +165,52 @@ def set_cartopy_grid(
     gl.xlocator = mticker.FixedLocator(lons)
     gl.ylocator = mticker.FixedLocator(lats)
 
-    # W, E, S, N / lbrt
-    map_extent = ax.get_extent()
-
     if label_lons is None:
         label_lons = lons
     if label_lats is None:
         label_lats = lats
 
-    # LATITUDE LABELS
-    some_lons = np.arange(gl.xlocator.locs.min(), gl.xlocator.locs.max(), 1)
-    for lat in label_lats:
-        if label_along_fixed is None:
-            # default
-            x0, _ = ax.get_xlim()
-            # interpolate latitude circle to map boundary
-            xyz_projected = proj.transform_points(
-                ccrs.PlateCarree(), some_lons, lat * np.ones_like(some_lons)
-            )
-            x = xyz_projected[:, 0]
-            y = xyz_projected[:, 1]
-            y0 = np.interp(x0, x, y)
-
-            # #
-            # boundary = LineString(map(tuple, ax.outline_patch.get_path().vertices))
-            # lats = LineString([(x, y) for x, y, _ in map(tuple, xyz_projected)])
-        else:
-            x0, y0 = proj.transform_point(label_along_fixed[0], lat, ccrs.PlateCarree())
-
-        if map_extent[2] < y0 < map_extent[3]:
-            ax.text(x0 - label_offset, y0, LATITUDE_FORMATTER(lat), **label_opts)
-
-    # LONGITUDE LABELS / COMPLETELY ANALOGOUS TO ABOVE
-    y0, _ = ax.get_ylim()
-    some_lats = np.arange(gl.ylocator.locs.min(), gl.ylocator.locs.max(), 1)
-    for lon in label_lons:
-        if label_along_fixed is None:
-            xyz_projected = proj.transform_points(
-                ccrs.PlateCarree(), lon * np.ones_like(some_lats), some_lats
-            )
-            x = xyz_projected[:, 0]
-            y = xyz_projected[:, 1]
-
-            x0 = np.interp(y0, y, x)
-        else:
-            x0, y0 = proj.transform_point(lon, label_along_fixed[1], ccrs.PlateCarree())
-
-        if map_extent[0] < x0 < map_extent[1]:
-            ax.text(x0, y0 - label_offset, LONGITUDE_FORMATTER(lon), **label_opts)
+    lat_xy, lat_visible, lon_xy, lon_visible = _grid_label_layout(
+        proj,
+        # W, E, S, N / lbrt
+        tuple(ax.get_extent()),
+        tuple(ax.get_xlim()),
+        tuple(ax.get_ylim()),
+        tuple(np.ravel(lons)),
+        tuple(np.ravel(lats)),
+        tuple(np.ravel(label_lons)),
+        tuple(np.ravel(label_lats)),
+        label_offset,
+        None if label_along_fixed is None else tuple(label_along_fixed),
+    )
+
+    for lat, (x, y) in zip(np.compress(lat_visible, label_lats), lat_xy[lat_visible]):
+        ax.text(x, y, LATITUDE_FORMATTER(lat), **label_opts)
+    for lon, (x, y) in zip(np.compress(lon_visible, label_lons), lon_xy[lon_visible]):
+        ax.text(x, y, LONGITUDE_FORMATTER(lon), **label_opts)
+
+def _clip_collections(ax):
+    """
+    Clip collections added before the boundary was set to the axes patch
+    (the patch is updated in place by set_boundary, so later changes to
+    the boundary carry over without re-adding anything).
+    """
+    for c in ax.collections:
+        if c.get_clip_path() is None:
+            c.set_clip_path(ax.patch)
+
+
+@lru_cache(maxsize=64)
+def _circumpolar_layout(proj, lat=62):
+    lons = np.arange(-180, 180, 60)
+    xy = proj.transform_points(ccrs.PlateCarree(), lons, np.full(len(lons), lat))
+    texts = [
+        "{:3d}$^\\circ${}".format(abs(lon), {True: "E", False: "W"}[lon >= 0])
+        for lon in lons
+    ]
+    rotations = np.where(np.abs(lons) <= 90, lons, lons - 180)
+    return Path.circle(radius=3e6), xy[:, :2], texts, rotations
+
 
 def circumpolar_axis(ax):
     """
@@ -149,28 +221,14 @@ def circumpolar_axis(ax):
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    circle = Path.circle(radius=3e6)
     proj = ax.projection
+    circle, xy, texts, rotations = _circumpolar_layout(proj)
     ax.set_boundary(circle, transform=proj)
-    # collections are only clipped when added after this point, so re-add them
-    for c in ax.collections:
-        c.remove()
-        ax.add_collection(c)
-
-    lat = 62
-
-    def rotation(lon):
-        if abs(lon) <= 90:
-            return lon
-        else:
-            return lon - 180
+    _clip_collections(ax)
 
-    for lon in np.arange(-180, 180, 60):
-        lon_text = "{:3d}$^\circ${}".format(abs(lon), {True: "E", False: "W"}[lon >= 0])
-        textopts = dict(va="center", ha="center", rotation=rotation(lon))
-        ax.text(
-            *proj.transform_point(lon, lat, ccrs.PlateCarree()), lon_text, **textopts
-        )
+    for (x, y), lon_text, rotation in zip(xy, texts, rotations):
+        textopts = dict(va="center", ha="center", rotation=rotation)
+        ax.text(x, y, lon_text, **textopts)
 
 
 def squeeze_axis_upward(ax, newy=0.5):
@@ -178,54 +236,70 @@ def squeeze_axis_upward(ax, newy=0.5):
     ax.set_position((x, newy, w, y + h - newy))
 
 
-from matplotlib.path import Path
 from shapely.geometry import LineString
 
 
-def latlon_curved_box_boundary(ax, proj, lbrt):
+@lru_cache(maxsize=64)
+def _curved_box_boundary(proj, lbrt, resolution=500):
+    """
+    lon/lat box given by lbrt, sampled at resolution points equally spaced
+    along its perimeter (in lon/lat), and projected.
+
+    Returns
+    -------
+    lonlat, path, (xmin, xmax), (ymin, ymax)
+    """
+    left, bottom, right, top = lbrt
+
+    corners = np.array([
+        (left, bottom),
+        (left, top),
+        (right, top),
+        (right, bottom),
+        (left, bottom),
+    ], dtype=float)
+
+    dist = np.concatenate([[0], np.cumsum(np.hypot(*np.diff(corners, axis=0).T))])
+    r = np.linspace(0, 1, resolution) * dist[-1]
+    lonlat = np.column_stack([np.interp(r, dist, corners[:, i]) for i in range(2)])
+
+    xy = proj.transform_points(ccrs.PlateCarree(), lonlat[:, 0], lonlat[:, 1])[:, :2]
+    path = Path(xy)
+    lonlat.flags.writeable = False
+    xmin, ymin = np.nanmin(xy, axis=0)
+    xmax, ymax = np.nanmax(xy, axis=0)
+    return lonlat, path, (xmin, xmax), (ymin, ymax)
+
+
+def latlon_curved_box_boundary(ax, proj, lbrt, resolution=500):
     """
     Clip the boundary of a map to one given by min/max lon/lat.
 
+    The projected boundary is cached per (proj, lbrt, resolution), and the
+    axis limits are set to its bounds plus the default axes margins.
+
     Arguments
     ---------
         ax: matplotlib axis
         proj: cartopy CRS
         lbrt: left, bottom, right, top boundary in lon/lat coordinates
+        resolution: number of points along the boundary
 
     License
     -------
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
+    lonlat, path, xlim, ylim = _curved_box_boundary(proj, tuple(lbrt), resolution)
 
-    left, bottom, right, top = lbrt
-
-    corners = [
-        (left, bottom),
-        (left, top),
-        (right, top),
-        (right, bottom),
-        (left, bottom),
-    ]
-
-    ls = LineString(corners)
-    ls = LineString(
-        [ls.interpolate(r, normalized=True) for r in np.linspace(0, 1, 500)]
-    )
-    arr = proj.transform_points(ccrs.PlateCarree(), *map(np.array, ls.coords.xy))
-    path = Path([(x, y) for x, y, _ in map(tuple, arr)])
-
-    proj = ax.projection
-    ax.set_boundary(path, transform=proj)
-    # collections are only clipped when added after this point, so re-add them
-    for c in ax.collections:
-        c.remove()
-        ax.add_collection(c)
+    ax.set_boundary(path, transform=ax.projection)
+    _clip_collections(ax)
 
-    _fig = mpl.figure.Figure()
-    _ax = _fig.add_axes([0.1, 0.1, 0.8, 0.8], projection=proj)
-    _ax.plot(arr[:, 0], arr[:, 1])
-    ax.set_xlim(*_ax.get_xlim())
-    ax.set_ylim(*_ax.get_ylim())
+    for lim, margin, set_lim in [
+        (xlim, mpl.rcParams["axes.xmargin"], ax.set_xlim),
+        (ylim, mpl.rcParams["axes.ymargin"], ax.set_ylim),
+    ]:
+        pad = margin * (lim[1] - lim[0])
+        set_lim(lim[0] - pad, lim[1] + pad)
 
-    return ls
+    return LineString(lonlat)
@@ -1,13 +1,44 @@
 import numpy as np
 import pandas as pd
 import functools
-from shapely.geometry import Point
 import geopandas as gpd
-from fiona.crs import from_epsg
+
+def _ddoy_values(values, epoch=None):
+    """
+    Decimal days since epoch for a (naive) datetime64 array or dask array.
+
+    If epoch is None, count from January 1 of each value's own year.
+    NaT becomes NaN.
+    """
+    values = values.astype('datetime64[ns]')
+    if epoch is None:
+        epoch = values.astype('datetime64[Y]').astype('datetime64[ns]')
+    return (values - epoch)/np.timedelta64(1, 'D')
+
+def _earliest_year_start(values):
+    """
+    January 1 of the earliest year among datetime64 values, ignoring NaT.
+    """
+    values = np.asarray(values, dtype='datetime64[ns]').ravel()
+    values = values[~np.isnat(values)]
+    if not len(values):
+        return np.datetime64('NaT', 'ns')
+    return values.min().astype('datetime64[Y]').astype('datetime64[ns]')
 
 def decimal_day_of_year(times, wrap=True):
     """
-    Convert pandas datetime series into decimal days of the year.
+    Convert datetimes into decimal days of the year.
+
+    Parameters
+    ----------
+    times : pandas Series or DatetimeIndex, numpy datetime64 array
+        or xarray DataArray (may be dask-backed)
+    wrap : bool
+
+    Returns
+    -------
+    Floats of the same container type as times, with index/coords preserved.
+    NaT becomes NaN.
 
     Notes
     -----
@@ -16,20 +47,37 @@ def decimal_day_of_year(times, wrap=True):
         wrap=True calculates day of the year for each year separately.
         wrap=False counts days from the earliest date in the series. Pay attention to
         leap years if you do so.
-    """
-    datatype = type(times)
 
-    if wrap:
-        ddoys = []
-        for year in times.dt.year.unique():
-            times_this_year = [t for t in times if t.year == year]
-            ddoys += list(decimal_day_of_year(datatype(times_this_year), wrap=False))
-        ddoys = datatype(ddoys)
+        tz-aware times are counted in their local (wall clock) time.
+    """
+    if isinstance(times, pd.Series):
+        t = pd.to_datetime(times)
+        if t.dt.tz is not None:
+            t = t.dt.tz_localize(None)
+        values = t.values
+    elif isinstance(times, pd.Index):
+        t = pd.DatetimeIndex(times)
+        if t.tz is not None:
+            t = t.tz_localize(None)
+        values = t.values
+    elif hasattr(times, 'dims') and hasattr(times, 'data'):
+        # xarray DataArray; keep dask arrays lazy
+        import xarray as xr
+        epoch = None if wrap else _earliest_year_start(times.min(skipna=True).values)
+        return xr.apply_ufunc(
+            _ddoy_values, times, kwargs=dict(epoch=epoch),
+            dask='parallelized', output_dtypes=[float],
+        )
     else:
-        # First day of the earliest year in time series.
-        epoch = pd.Timestamp(year=times.min().year, month=1, day=1)
-        ddoys = (times - epoch)/pd.Timedelta(days=1)
+        values = np.asarray(times)
 
+    epoch = None if wrap else _earliest_year_start(values)
+    ddoys = _ddoy_values(values, epoch=epoch)
+
+    if isinstance(times, pd.Series):
+        return pd.Series(ddoys, index=times.index, name=times.name)
+    elif isinstance(times, pd.Index):
+        return pd.Index(ddoys, name=times.name)
     return ddoys
 
 
@@ -109,7 +157,7 @@ def with_df_as_numeric(func):
         return df
     return wrapper
 
-def df_to_gdf(df, lon='lon', lat='lat'):
+def df_to_gdf(df, lon='lon', lat='lat', crs='EPSG:4326', copy=True):
     """
     Turn pandas dataframe with latitude, longitude columns into GeoDataFrame with according Point geometry.
 
@@ -117,6 +165,10 @@ def df_to_gdf(df, lon='lon', lat='lat'):
     ----------
     df : pandas dataframe
     lon, lat : names of lon, lat columns
+    crs : anything accepted by pyproj.CRS.from_user_input
+    copy : bool
+        If False, build the GeoDataFrame on top of df's columns without copying
+        them (df itself is left unchanged).
 
     Returns
     -------
@@ -127,10 +179,42 @@ def df_to_gdf(df, lon='lon', lat='lat'):
     GNU-GPLv3, (C) A. R.
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    df = gpd.GeoDataFrame(df).copy()
-    df['geometry'] = [Point(x, y) for x, y in zip(df[lon], df[lat])]
-    df.crs = from_epsg(4326)
-    return df
+    geometry = gpd.points_from_xy(df[lon], df[lat], crs=crs)
+    return gpd.GeoDataFrame(df, geometry=geometry, copy=copy)
+
+def df_to_geofile(chunks, path, lon='lon', lat='lat', crs='EPSG:4326', format='parquet'):
+    """
+    Chunked version of df_to_gdf for data that do not fit into memory.
+    Each chunk is converted and written to its own file in directory `path`,
+    which can be read back in one go with e.g. gpd.read_parquet(path).
+
+    Parameters
+    ----------
+    chunks : iterable of pandas dataframes (e.g. pd.read_csv(..., chunksize=N))
+    path : output directory
+    lon, lat, crs : see df_to_gdf
+    format : {'parquet', 'feather'}
+
+    Returns
+    -------
+    list of written file names
+
+    License
+    -------
+    GNU-GPLv3, (C) A. R.
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    import os
+    if format not in ['parquet', 'feather']:
+        raise ValueError(f'format must be one of parquet, feather, not {format}')
+    os.makedirs(path, exist_ok=True)
+    fnames = []
+    for k, chunk in enumerate(chunks):
+        gdf = df_to_gdf(chunk, lon=lon, lat=lat, crs=crs, copy=False)
+        fname = os.path.join(path, f'part-{k:05d}.{format}')
+        getattr(gdf, f'to_{format}')(fname)
+        fnames.append(fname)
+    return fnames
 
 def pandas_df_to_markdown_table(df):
     """
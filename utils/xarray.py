@@ -5,7 +5,31 @@ from functools import reduce
 
 from .cartopy import transform_points
 
-def transform_dataset(ds, coords, from_crs, to_crs):
+def _transform_block(x, y, from_crs, to_crs, dtype=None):
+    """
+    transform_points for n-dimensional blocks, keeping only x and y.
+    """
+    x, y = np.broadcast_arrays(x, y)
+    xp, yp = transform_points(from_crs, to_crs, x.ravel(), y.ravel())
+    xp, yp = xp.reshape(x.shape), yp.reshape(x.shape)
+    if dtype is not None:
+        xp, yp = xp.astype(dtype), yp.astype(dtype)
+    return xp, yp
+
+def _is_separable(x, y, from_crs, to_crs, n_probe=5):
+    """
+    Check on a few probe lines whether transformed x depends on x only
+    and transformed y on y only.
+    """
+    xs = np.unique(x.values[np.linspace(0, x.size-1, n_probe).astype(int)])
+    ys = np.unique(y.values[np.linspace(0, y.size-1, n_probe).astype(int)])
+    xp, yp = _transform_block(xs[np.newaxis, :], ys[:, np.newaxis], from_crs, to_crs)
+    return (
+        np.allclose(xp, xp[:1], rtol=1e-12, atol=0, equal_nan=True)
+        and np.allclose(yp, yp[:, :1], rtol=1e-12, atol=0, equal_nan=True)
+    )
+
+def transform_dataset(ds, coords, from_crs, to_crs, lazy=False, dtype=None, separable=False):
     """
     Transform coordinates of a Dataset or DataArray.
 
@@ -17,23 +41,57 @@ def transform_dataset(ds, coords, from_crs, to_crs):
         coords: iterable of dimension, coordinates, or data variable names
             that hold the coordinates to be transformed
         from_crs, to_crs: cartopy CRS instances
+        lazy: bool, if True, transform chunk by chunk with dask, following
+            the chunks of ds, and return DataArrays
+        dtype: output dtype, e.g. np.float32
+        separable: bool, if True and the coordinates are 1-D along different
+            dimensions, check whether the transformation acts on each of them
+            separately (e.g. PlateCarree to Mercator), and if so, return
+            1-D DataArrays
     """
     x = ds[coords[0]]
     y = ds[coords[1]]
 
-    x, y = xr.broadcast(x, y) # coerce to at least 2D
-    dims = x.dims
-
-    xp, yp = transform_points(from_crs, to_crs, x.values, y.values)
-
-    return ((dims, xp), (dims, yp))
+    if (separable and x.ndim == 1 and y.ndim == 1 and x.dims != y.dims
+            and _is_separable(x, y, from_crs, to_crs)):
+        xp, _ = _transform_block(x.values, y.values[0], from_crs, to_crs, dtype)
+        _, yp = _transform_block(x.values[0], y.values, from_crs, to_crs, dtype)
+        return x.copy(data=xp), y.copy(data=yp)
+
+    if not lazy:
+        x, y = xr.broadcast(x, y) # coerce to at least 2D
+        dims = x.dims
+        xp, yp = _transform_block(x.values, y.values, from_crs, to_crs, dtype)
+        return ((dims, xp), (dims, yp))
+
+    # follow the chunking of ds
+    chunksizes = ds.chunksizes
+    # base variables, because index coordinates cannot be chunked
+    x, y = (
+        xr.DataArray(
+            c.variable.to_base_variable().chunk(
+                {d: chunksizes[d] for d in c.dims if d in chunksizes}),
+            coords=c.coords,
+        )
+        for c in (x, y)
+    )
+    out_dtype = float if dtype is None else dtype
+    return xr.apply_ufunc(
+        _transform_block, x, y,
+        kwargs=dict(from_crs=from_crs, to_crs=to_crs, dtype=dtype),
+        output_core_dims=[[], []],
+        dask='parallelized',
+        output_dtypes=[out_dtype, out_dtype],
+    )
 
 def crop(ds, **constraints):
     """
     Crop an xarray dataset.
 
     Discards all coordinates where a given coordinate or data variable is outside
-    the bounds given by the respective tuple.
+    the bounds given by the respective tuple. The constraints are evaluated only
+    on the constrained variables, the other variables are cut with a single isel
+    (they are not NaN-masked and keep their dtype; dask-backed variables stay lazy).
 
     Arguments
     ---------
@@ -42,32 +100,86 @@ def crop(ds, **constraints):
             and values are tuples that will bound that coordinate or data_var.
     """
     ds = ds.set_coords(list(constraints))
-    # set nan
-    for var, (varmin, varmax) in constraints.items():
-        ds = ds.where((ds[var]>varmin) & (ds[var]<varmax))
-    # crop array
-    for dim in ds.dims:
-        other_dims = [d for d in ds.dims if d != dim]
-        all_nans = [ds[var].isnull().all(other_dims) for var in ds.data_vars]
-        all_nan = reduce(lambda x, y: x&y, all_nans)
-        ds = ds.isel({dim: ~all_nan})
+    masks = [
+        (ds[var]>varmin) & (ds[var]<varmax)
+        for var, (varmin, varmax) in constraints.items()
+    ]
+    if not masks:
+        return ds
+    mask = reduce(lambda x, y: x&y, masks).compute()
+
+    keep = {}
+    for dim in mask.dims:
+        other_dims = [d for d in mask.dims if d != dim]
+        keep[dim] = np.flatnonzero(mask.any(other_dims).values)
+    return ds.isel(keep)
+
+def _apply_rows(func, templates, blocks, kwargs):
+    """
+    Apply func to each row of the 2-D (cells x dim) blocks, wrapping rows
+    as 1-D DataArrays shaped like templates.
+    """
+    results = np.full(blocks[0].shape[0], np.nan)
+    for i in range(len(results)):
+        results[i] = func(
+            *(t.copy(deep=False, data=b[i]) for t, b in zip(templates, blocks)),
+            **kwargs
+        )
+    return results
 
-    return ds
+def _apply_block(*arrays, func, templates, vectorized, processes, kwargs):
+    """
+    Reshape ndarrays with dim as last axis to (cells x dim) and apply func.
+    """
+    shape = np.broadcast_shapes(*(a.shape[:-1] for a in arrays))
+    blocks = [
+        np.broadcast_to(a, shape + a.shape[-1:]).reshape(-1, a.shape[-1])
+        for a in arrays
+    ]
+    ncells = blocks[0].shape[0]
+    if vectorized:
+        results = np.asarray(func(*blocks, **kwargs), dtype=float)
+    elif processes is not None and processes != 1 and ncells > 1:
+        import os
+        from concurrent.futures import ProcessPoolExecutor
+        from functools import partial
+        nworkers = processes or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=nworkers) as executor:
+            splits = np.array_split(np.arange(ncells), min(4*nworkers, ncells))
+            parts = executor.map(
+                partial(_apply_rows, func, templates, kwargs=kwargs),
+                ([b[s] for b in blocks] for s in splits),
+            )
+            results = np.concatenate(list(parts))
+    else:
+        results = _apply_rows(func, templates, blocks, kwargs)
+    return results.reshape(shape)
 
-def apply_1d(over_da, func, dim, **kwargs):
+def apply_1d(over_da, func, dim, vectorized=False, processes=None, **kwargs):
     """
     For those occasions where you'd think that ds.reduce() should do the trick,
     but you somehow don't have a function that already handles ndarrays.
 
+    Data are reshaped to one (cells x dim) block per DataArray, and func is
+    applied to its rows. Dask-backed input is processed lazily, chunk by chunk.
+
     Parameters
     ----------
     over_da : xarray DataArray or list thereof
-    func : Function that can handle a 1-dimensional ndarray
+    func : Function that can handle a 1-dimensional DataArray along dim
+        and return a scalar
     dim : Dimension over which to apply func
+    vectorized : bool
+        If True, func is called once per block with 2-D ndarrays of shape
+        (cells, len(dim)) and must return an array of shape (cells,).
+    processes : int, optional
+        Distribute the rows of each block over a pool of this many processes
+        (0 for one per CPU). func and kwargs must then be picklable.
 
     Usage
     -----
     e.g.: apply_1d(da, ols, dim='Depth', param='slope')
+          apply_1d(da, lambda a: np.nanmax(a, axis=-1), dim='Depth', vectorized=True)
 
     License
     -------
@@ -77,37 +189,98 @@ def apply_1d(over_da, func, dim, **kwargs):
     if not isinstance(over_da, list):
         over_da = [over_da]
 
-    da_dropped = over_da[0].isel({dim: 0}).drop(dim)
-    dims = da_dropped.coords.dims
+    da_dropped = over_da[0].isel({dim: 0}).drop_vars(dim, errors='ignore')
+    dims = da_dropped.dims
 
-    results = np.nan * da_dropped
-    for idx, _ in np.ndenumerate(da_dropped):
-        sel_dict = {c: i for c, i in zip(dims, idx)}
-        res = func(
-            *(da[sel_dict] for da in over_da),
-            **kwargs
-        )
-        results[sel_dict] = res
-    return results
+    # 1-D stand-ins for what used to be da[sel_dict]
+    templates = [
+        da.isel({d: 0 for d in da.dims if d != dim}, drop=True) for da in over_da
+    ]
+
+    results = xr.apply_ufunc(
+        _apply_block, *over_da,
+        input_core_dims=[[dim]]*len(over_da),
+        kwargs=dict(func=func, templates=templates, vectorized=vectorized,
+                    processes=processes, kwargs=kwargs),
+        dask='parallelized',
+        output_dtypes=[float],
+        dask_gufunc_kwargs=dict(allow_rechunk=True),
+    )
+    results = results.transpose(*dims)
+    return da_dropped.copy(data=results.data).astype(float)
 
 
-def critical_index_value(vals, crit_val, dim, smaller_than):
+def _first_crossing(vals, z, crit_vals, smaller_than, interpolate):
+    """
+    Core of critical_index_value for ndarrays with dim as last axis.
+
+    Returns array of shape vals.shape[:-1] + (len(crit_vals),).
+    """
+    v = vals[..., np.newaxis, :]
+    c = crit_vals[:, np.newaxis]
+    criterion = v < c if smaller_than else v > c
+    idx = np.argmax(criterion, axis=-1)[..., np.newaxis] #True>False
+    found = np.take_along_axis(criterion, idx, axis=-1)[..., 0]
+    idx = idx[..., 0]
+
+    res = z[idx]
+    if interpolate:
+        prev = np.maximum(idx - 1, 0)
+        v1 = np.take_along_axis(vals, idx, axis=-1)
+        v0 = np.take_along_axis(vals, prev, axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frac = (crit_vals - v0)/(v1 - v0)
+        z_interp = z[prev] + frac*(z[idx] - z[prev])
+        # at index 0 or next to nans, fall back to the first index that qualifies
+        res = np.where((idx > 0) & np.isfinite(z_interp), z_interp, res)
+    return np.where(found, res, np.nan)
+
+def critical_index_value(vals, crit_val, dim, smaller_than, interpolate=False):
     """
     Find the first value of an index (`dim`: str) where some value (`vals`: xr.DataArray) becomes
     larger or smaller (`smaller_than`: bool) than `crit_val` (float).
 
+    Works chunk by chunk on dask-backed `vals` (dim is not chunked).
+
+    Parameters
+    ----------
+    crit_val : float or list of floats
+        With a list, all thresholds are found in one pass and the result gets
+        a new dimension 'crit_val'.
+    interpolate : bool
+        Interpolate linearly in `dim` between the last index before and the first
+        index after the crossing.
+
+    Returns
+    -------
+    DataArray of (float) `dim` values, NaN where the criterion is never met.
+
     Example
     -----
         To find Zeu, where iPAR drops below 1% of surface iPAR0-:
         ds['Zeu'] = critical_index_value(ds['iPAR']/ds['iPAR0minus'], 0.01, 'Depth', True)
+        To find 1%, 10% and 50% light levels:
+        critical_index_value(ds['iPAR']/ds['iPAR0minus'], [.01, .1, .5], 'Depth', True, interpolate=True)
     """
-    if smaller_than:
-        criterion = vals<crit_val
-    else:
-        criterion = vals>crit_val
-    idx = criterion.reduce(np.argmax, dim=dim) #True>False
-    return xr.where(idx>0, vals[dim].isel(**{dim:idx}), np.nan)
-    
+    scalar = np.ndim(crit_val) == 0
+    crit_vals = np.atleast_1d(np.asarray(crit_val, dtype=float))
+    z = vals[dim].values.astype(float)
+
+    res = xr.apply_ufunc(
+        _first_crossing, vals,
+        input_core_dims=[[dim]],
+        output_core_dims=[['crit_val']],
+        kwargs=dict(z=z, crit_vals=crit_vals, smaller_than=smaller_than,
+                    interpolate=interpolate),
+        dask='parallelized',
+        output_dtypes=[float],
+        dask_gufunc_kwargs=dict(output_sizes={'crit_val': len(crit_vals)},
+                                allow_rechunk=True),
+    )
+    if scalar:
+        return res.isel(crit_val=0)
+    return res.assign_coords(crit_val=crit_vals)
+
 
 def ols(da, param='slope'):
     """
@@ -159,58 +332,223 @@ def ols(da, param='slope'):
         return np.nan
 
 
-# implement precision for uniqueness?
-# np.round(12.3456789, decimals=4)
+def ols_field(da, dim):
+    """
+    Closed-form OLS regression of da against its coordinate dim, for all
+    other indices at once. NaNs are ignored per column; dask-backed input
+    stays lazy. Handles datetimes (in that case, regression is against days
+    since 1970-01-01, as in `ols`).
+
+    Parameters
+    ----------
+    da : xarray DataArray
+    dim : str, dimension along which to regress
+
+    Returns
+    -------
+    xarray Dataset with data_vars 'slope', 'intercept', 'slope_se',
+    'intercept_se', 'slope_pvalue', 'intercept_pvalue'
+    (NaN where there are fewer than two valid points)
+
+    Usage
+    -----
+    e.g.: trends = ols_field(ds['sst'], dim='time')
+
+    License
+    -------
+    GNU-GPLv3, (C) A. Randelhoff
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    from scipy.stats import t as t_dist
+
+    x = da[dim]
+    if x.dtype.kind in ['M']:
+        x = (x - np.datetime64('1970-01-01'))/np.timedelta64(1, 'D')
+    x = x.astype(float)
+
+    valid = da.notnull() & x.notnull()
+    n = valid.sum(dim)
+    x = x.where(valid)
+    y = da.where(valid)
+
+    # centred sums for numerical stability
+    x_mean = x.mean(dim)
+    y_mean = y.mean(dim)
+    dx = x - x_mean
+    dy = y - y_mean
+    sxx = (dx**2).sum(dim)
+    slope = (dx*dy).sum(dim)/sxx
+    intercept = y_mean - slope*x_mean
+
+    dof = n - 2
+    s2 = ((dy - slope*dx)**2).sum(dim)/dof
+    slope_se = np.sqrt(s2/sxx)
+    intercept_se = np.sqrt(s2*(1/n + x_mean**2/sxx))
+
+    def pvalue(tval, dof):
+        return xr.apply_ufunc(
+            lambda t, df: 2*t_dist.sf(np.abs(t), df), tval, dof,
+            dask='parallelized', output_dtypes=[float],
+        )
+
+    res = xr.Dataset(dict(
+        slope=slope,
+        intercept=intercept,
+        slope_se=slope_se,
+        intercept_se=intercept_se,
+        slope_pvalue=pvalue(slope/slope_se, dof),
+        intercept_pvalue=pvalue(intercept/intercept_se, dof),
+    ))
+    return res.where(n >= 2)
+
 
-# np.unique(ds.longitude.isel(profile_id=0))[2]
+def _unique_along_last(x, decimals=None, rtol=None):
+    """
+    Core of get_unique for an ndarray: reduce the last axis.
 
-def get_unique(x, axis=0):
+    Returns
+    -------
+    u : ndarray of shape x.shape[:-1] with the unique non-null value
+        (null where the slice is all null or non-unique)
+    conflict : bool ndarray of shape x.shape[:-1],
+        True where a slice holds more than one distinct non-null value
+    """
+    is_obj = x.dtype.char == 'O'
+    is_dt = np.issubdtype(x.dtype, np.datetime64)
+
+    if is_obj:
+        isnull = pd.isnull(x) | (x == '')
+    elif is_dt:
+        isnull = np.isnat(x)
+    else: # numeric
+        x = x.astype(float)
+        if decimals is not None:
+            x = np.round(x, decimals=decimals)
+        isnull = np.isnan(x)
+
+    all_null = isnull.all(axis=-1)
+    first_idx = np.argmax(~isnull, axis=-1)[..., np.newaxis]
+    first = np.take_along_axis(x, first_idx, axis=-1)
+
+    if is_obj:
+        conflict = ((x != first) & ~isnull).any(axis=-1)
+    elif is_dt:
+        i8 = x.view('i8')
+        imax = np.where(isnull, np.iinfo('i8').min, i8).max(axis=-1)
+        imin = np.where(isnull, np.iinfo('i8').max, i8).min(axis=-1)
+        conflict = ~all_null & (imax != imin)
+    else:
+        with np.errstate(invalid='ignore'):
+            xmax = np.where(isnull, -np.inf, x).max(axis=-1)
+            xmin = np.where(isnull, np.inf, x).min(axis=-1)
+            spread = xmax - xmin
+            if rtol is None:
+                conflict = ~all_null & (spread != 0)
+            else:
+                scale = np.maximum(np.abs(xmax), np.abs(xmin))
+                conflict = ~all_null & (spread > rtol*scale)
+
+    u = first[..., 0].copy()
+    if is_dt:
+        u[all_null | conflict] = np.datetime64('NaT')
+    elif is_obj:
+        u[all_null | conflict] = ''
+    else:
+        u[all_null | conflict] = np.nan
+    return u, conflict
+
+def _is_dask(x):
+    return type(x).__module__.split('.')[0] == 'dask'
+
+def _out_dtype(x):
+    if x.dtype.char == 'O' or np.issubdtype(x.dtype, np.datetime64):
+        return x.dtype
+    return np.dtype(float)
+
+def nonunique_mask(x, axis=0, decimals=None, rtol=None):
+    """
+    Boolean mask that is True wherever get_unique(x, axis) would fail,
+    i.e. where there is more than one non-nan value along axis.
+
+    Usage
+    -----
+    ds.reduce(nonunique_mask, dim=some_dim)
+
+    License
+    -------
+    GNU-GPLv3, (C) A. Randelhoff
+    (https://github.com/poplarShift/python-data-science-utils)
+    """
+    if _is_dask(x):
+        x = x.rechunk({axis: -1})
+        return x.map_blocks(
+            nonunique_mask, axis=axis, decimals=decimals, rtol=rtol,
+            drop_axis=axis, dtype=bool,
+        )
+    x_ = np.moveaxis(np.asarray(x), source=axis, destination=-1)
+    return _unique_along_last(x_, decimals=decimals, rtol=rtol)[1]
+
+def _raise_if_nonunique(conflict):
+    if conflict.any():
+        idx = [tuple(int(k) for k in i) for i in np.argwhere(conflict)]
+        raise ValueError(
+            f'Non-unique slices encountered at {len(idx)} indices: {idx}'
+        )
+
+def get_unique(x, axis=0, decimals=None, rtol=None, errors='raise'):
     """
     Return unique non-nan value along specified xarray axis.
     Use this to squeeze out dimensions with length>1.
 
+    Parameters
+    ----------
+    x : ndarray or dask array
+    axis : int
+    decimals : int, optional
+        Round floats to this many decimals before comparing them
+        (the returned value is rounded, too).
+    rtol : float, optional
+        Treat floats as equal if they differ by at most rtol (relative).
+    errors : {'raise', 'null'}
+        What to do with slices that hold more than one non-nan value:
+        raise, or return nan/NaT/'' for them. See also nonunique_mask.
+        For dask input, 'raise' computes nonunique_mask right away (the
+        result itself stays lazy); use 'null' to avoid that.
+
     Raises
     ------
-    ValueError: if there are more than one non-nan values
+    ValueError: if there are more than one non-nan values, listing all
+        offending indices (with axis removed)
 
     Usage
     -----
     ds.reduce(get_unique, dim=some_dim)
+    ds.reduce(get_unique, dim=some_dim, decimals=4)
 
     License
     -------
     GNU-GPLv3, (C) A. Randelhoff
     (https://github.com/poplarShift/python-data-science-utils)
     """
-    is_obj = x.dtype.char == 'O'
-    is_dt = np.issubdtype(x.dtype, np.datetime64)
-    x_ = np.moveaxis(x, source=axis, destination=-1)
-    iteridx = x_.shape[:-1]
-    if is_dt:
-        u = np.zeros(iteridx, dtype=x.dtype)
-    elif is_obj:
-        u = np.zeros(iteridx, dtype=x.dtype)
-    else: # numeric
-        u = np.nan*np.zeros(iteridx)
-
-    if not isinstance(u, np.ndarray):
-        # if iteridx was empty tuple
-        u = np.array(u)
-
-    isnull = lambda x: pd.isnull(x) | (x == '')
-
-    for i in np.ndindex(iteridx):
-        u_1dim = np.unique(x_[i])
-        u_non_null = u_1dim[~isnull(u_1dim)]
-        if len(u_non_null)==1:
-            u[i] = u_non_null[0]
-        elif isnull(u_1dim[0]):
-            if is_dt:
-                u[i] = np.datetime64('NaT')
-            elif is_obj:
-                u[i] = ''
-            else:
-                u[i] = np.nan
-        else:
-            raise ValueError(f'Non-unique slices encountered at {i}!')
+    if errors not in ['raise', 'null']:
+        raise ValueError(f'errors must be one of raise, null, not {errors}')
+
+    if _is_dask(x):
+        x = x.rechunk({axis: -1})
+        if errors == 'raise':
+            # check the whole array up front, so that all offending indices
+            # are reported, relative to x rather than to a chunk
+            _raise_if_nonunique(
+                nonunique_mask(x, axis=axis, decimals=decimals, rtol=rtol).compute()
+            )
+        return x.map_blocks(
+            get_unique, axis=axis, decimals=decimals, rtol=rtol, errors='null',
+            drop_axis=axis, dtype=_out_dtype(x),
+        )
+
+    x_ = np.moveaxis(np.asarray(x), source=axis, destination=-1)
+    u, conflict = _unique_along_last(x_, decimals=decimals, rtol=rtol)
+
+    if errors == 'raise':
+        _raise_if_nonunique(conflict)
     return u